@@ -1,21 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 import os
+import io
+import csv
+import json
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import AsyncSessionLocal
+from app.db.models import Activity, Suggestion
+from app.db.pagination import MAX_PAGE_SIZE, apply_keyset, split_page
+from app.db.crud import (
+    bulk_create_suggestions_async,
+    upsert_daily_rollup_async,
+    enqueue_outbox_async
+)
 
-from sqlalchemy.orm import Session
-
-from app.db.session import SessionLocal, init_db
-from app.db.models import Activity
-from app.db.crud import create_suggestion
-
-from app.services.messaging import publish_activity
-from app.services.ai_service import rule_based_suggestions
+from app.services import outbox
+from app.services.response_cache import bump_user_async
+from app.api.auth import current_user, check_user
+from app.services.ai_service import rule_based_suggestions, rule_based_suggestions_batch
 from app.services.emissions import (
-    estimate_travel,
-    estimate_electricity,
-    estimate_food
+    estimate_food,
+    estimate_travel_async,
+    estimate_electricity_async,
+    estimate_batch
 )
 
 # --------------------------------------------------
@@ -25,6 +39,21 @@ from app.services.emissions import (
 router = APIRouter()
 #init_db()  ---NOTE Changes
 
+MAX_BATCH_SIZE = int(os.getenv("MAX_ACTIVITY_BATCH", "500"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+# columns written by GET /activities/export, per kind
+EXPORT_COLUMNS = {
+    "activities": (Activity, [
+        "id", "user_id", "type", "mode", "distance_km", "kwh",
+        "food_category", "co2_kg", "calculation_source", "created_at"
+    ]),
+    "suggestions": (Suggestion, [
+        "id", "activity_id", "user_id", "suggestion_text", "est_saving_kg",
+        "difficulty", "source", "created_at"
+    ]),
+}
+
 # --------------------------------------------------
 # Request / Response Schemas
 # --------------------------------------------------
@@ -60,73 +89,77 @@ class ActivityOutFull(BaseModel):
     calculation_source: str
     created_at: datetime
 
+
+class ActivityBatchIn(BaseModel):
+    # raw dicts so one bad item doesn't reject the whole batch
+    items: List[Dict[str, Any]]
+
+
+class ActivityBatchItemOut(BaseModel):
+    index: int
+    ok: bool
+    activity_id: Optional[int] = None
+    co2_kg: Optional[float] = None
+    calculation_source: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ActivityBatchOut(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[ActivityBatchItemOut]
+
 # --------------------------------------------------
 # DB Dependency
 # --------------------------------------------------
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # --------------------------------------------------
-# Create Activity
+# Helpers
 # --------------------------------------------------
 
-@router.post("/", response_model=ActivityOut)
-def create_activity(
-    payload: ActivityIn,
-    db: Session = Depends(get_db)
-):
-    """
-    Create a user activity and calculate CO2 emissions.
-    """
+def _calculation_source() -> str:
+    return (
+        "climatiq"
+        if os.getenv("CLIMATIQ_API_KEY")
+        else "local_factors"
+    )
 
-    # -----------------------------
-    # Validation + Emission Calc
-    # -----------------------------
 
+def _check_fields(payload: ActivityIn):
+    """
+    Validate the activity fields for its type.
+    Raises ValueError with a client-facing message.
+    """
     if payload.type == "travel":
         if payload.mode is None or payload.distance_km is None:
-            raise HTTPException(
-                status_code=400,
-                detail="travel requires mode and distance_km"
-            )
-
-        co2 = estimate_travel(payload.mode, payload.distance_km)
-
+            raise ValueError("travel requires mode and distance_km")
     elif payload.type == "electricity":
         if payload.kwh is None:
-            raise HTTPException(
-                status_code=400,
-                detail="electricity requires kwh"
-            )
+            raise ValueError("electricity requires kwh")
+    elif payload.type != "food":
+        raise ValueError("Invalid activity type")
 
-        co2 = estimate_electricity(payload.kwh)
 
-    elif payload.type == "food":
-        category = (payload.food_category or "veg").lower()
-        co2 = estimate_food(category)
+async def _estimate_co2_async(payload: ActivityIn) -> float:
+    """Validate the activity fields and calculate CO2; Climatiq factors are fetched without a thread."""
+    _check_fields(payload)
 
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid activity type"
-        )
+    if payload.type == "travel":
+        return await estimate_travel_async(payload.mode, payload.distance_km)
 
-    calculation_source = (
-        "climatiq"
-        if os.getenv("CLIMATIQ_API_KEY")
-        else "local_factors"
-    )
+    if payload.type == "electricity":
+        return await estimate_electricity_async(payload.kwh)
+
+    category = (payload.food_category or "veg").lower()
+    return estimate_food(category)
 
-    # -----------------------------
-    # Persist Activity
-    # -----------------------------
 
-    db_item = Activity(
+def _build_activity(payload: ActivityIn, co2: float, calculation_source: str) -> Activity:
+    return Activity(
         user_id=payload.user_id,
         type=payload.type,
         mode=payload.mode,
@@ -138,45 +171,36 @@ def create_activity(
         meta=payload.meta or {}
     )
 
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-
-    # -----------------------------
-    # Immediate Rule-Based Suggestions
-    # -----------------------------
 
-    try:
-        fallback_suggestions = rule_based_suggestions({
-            "user_id": db_item.user_id,
-            "type": db_item.type,
-            "mode": db_item.mode,
-            "distance_km": db_item.distance_km,
-            "kwh": db_item.kwh,
-            "food_category": db_item.food_category,
-            "co2_kg": db_item.co2_kg
-        })
-
-        for s in fallback_suggestions:
-            create_suggestion(
-                db=db,
-                user_id=db_item.user_id,
-                activity_id=db_item.id,
-                text=s.get("text"),
-                est_saving=s.get("est_saving_kg"),
-                difficulty=s.get("difficulty"),
-                meta={"stage": "fallback"},
-                source="fallback"
-            )
-
-    except Exception as e:
-        print("Failed to create fallback suggestions:", e)
+def _rule_input(db_item: Activity) -> Dict[str, Any]:
+    return {
+        "user_id": db_item.user_id,
+        "type": db_item.type,
+        "mode": db_item.mode,
+        "distance_km": db_item.distance_km,
+        "kwh": db_item.kwh,
+        "food_category": db_item.food_category,
+        "co2_kg": db_item.co2_kg
+    }
 
-    # -----------------------------
-    # Publish to RabbitMQ
-    # -----------------------------
 
-    payload_for_queue = {
+def _fallback_rows(db_item: Activity, fallback_suggestions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "user_id": db_item.user_id,
+            "activity_id": db_item.id,
+            "text": s.get("text"),
+            "est_saving": s.get("est_saving_kg"),
+            "difficulty": s.get("difficulty"),
+            "meta": {"stage": "fallback"},
+            "source": "fallback"
+        }
+        for s in fallback_suggestions
+    ]
+
+
+def _queue_payload(db_item: Activity) -> Dict[str, Any]:
+    return {
         "activity_id": db_item.id,
         "user_id": db_item.user_id,
         "type": db_item.type,
@@ -188,9 +212,64 @@ def create_activity(
          "ai_attempted": True
     }
 
-    published = publish_activity(payload_for_queue)
-    if not published:
-        print("Failed to publish activity:", db_item.id)
+# --------------------------------------------------
+# Create Activity
+# --------------------------------------------------
+
+@router.post("/", response_model=ActivityOut)
+async def create_activity(
+    payload: ActivityIn,
+    db: AsyncSession = Depends(get_db),
+    current: Optional[str] = Depends(current_user)
+):
+    """
+    Create a user activity and calculate CO2 emissions.
+    """
+    check_user(current, payload.user_id)
+
+    # -----------------------------
+    # Validation + Emission Calc
+    # -----------------------------
+
+    try:
+        co2 = await _estimate_co2_async(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # -----------------------------
+    # Persist Activity
+    # -----------------------------
+
+    db_item = _build_activity(payload, co2, _calculation_source())
+
+    try:
+        db.add(db_item)
+        await db.flush()
+        await upsert_daily_rollup_async(db, [db_item])
+
+        # -----------------------------
+        # Immediate Rule-Based Suggestions
+        # -----------------------------
+
+        try:
+            fallback_rows = _fallback_rows(db_item, rule_based_suggestions(_rule_input(db_item)))
+        except Exception as e:
+            print("Failed to build fallback suggestions:", e)
+            fallback_rows = []
+        await bulk_create_suggestions_async(db, fallback_rows)
+
+        # -----------------------------
+        # Queue message via the outbox (same transaction)
+        # -----------------------------
+
+        await enqueue_outbox_async(db, [_queue_payload(db_item)])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    await bump_user_async(db_item.user_id)
+    outbox.nudge()
 
     return {
         "activity_id": db_item.id,
@@ -198,21 +277,208 @@ def create_activity(
         "calculation_source": db_item.calculation_source
     }
 
+# --------------------------------------------------
+# Create Activities (batch)
+# --------------------------------------------------
+
+@router.post("/batch", response_model=ActivityBatchOut)
+async def create_activities_batch(
+    payload: ActivityBatchIn,
+    db: AsyncSession = Depends(get_db),
+    current: Optional[str] = Depends(current_user)
+):
+    """
+    Create many activities in one transaction.
+    Invalid items are reported per index and skipped; valid ones are stored.
+    """
+    if len(payload.items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"batch exceeds {MAX_BATCH_SIZE} items"
+        )
+
+    results: List[Dict[str, Any]] = [None] * len(payload.items)
+    accepted = []  # (index, Activity)
+    calculation_source = _calculation_source()
+
+    # -----------------------------
+    # Validation + Emission Calc
+    # -----------------------------
+
+    def _validate_all():
+        valid = []  # (index, ActivityIn)
+        for i, raw in enumerate(payload.items):
+            try:
+                item = ActivityIn.model_validate(raw)
+                _check_fields(item)
+                if current is not None and item.user_id != current:
+                    raise ValueError("user_id does not match token")
+            except ValidationError as e:
+                results[i] = {"index": i, "ok": False, "error": "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+                    for err in e.errors()
+                )}
+                continue
+            except ValueError as e:
+                results[i] = {"index": i, "ok": False, "error": str(e)}
+                continue
+            valid.append((i, item))
+
+        if not valid:
+            return
+
+        # price the whole batch in one columnar pass
+        estimate = estimate_batch(
+            [item.type for _, item in valid],
+            [item.mode for _, item in valid],
+            [item.distance_km for _, item in valid],
+            [item.kwh for _, item in valid],
+            [item.food_category for _, item in valid],
+        )
+        for (i, item), co2, error in zip(valid, estimate.co2_kg, estimate.errors):
+            if error is not None:
+                results[i] = {"index": i, "ok": False, "error": error}
+                continue
+            accepted.append((i, _build_activity(item, float(co2), calculation_source)))
+
+    await run_in_threadpool(_validate_all)
+
+    # -----------------------------
+    # Persist Activities + Fallbacks
+    # -----------------------------
+
+    if accepted:
+        items = [a for _, a in accepted]
+        try:
+            db.add_all(items)
+            await db.flush()  # one multi-row INSERT ... RETURNING for the ids
+            await upsert_daily_rollup_async(db, items)
+
+            fallback_rows = []
+            try:
+                evaluated = rule_based_suggestions_batch([_rule_input(a) for a in items])
+                for a, suggestions in zip(items, evaluated):
+                    fallback_rows.extend(_fallback_rows(a, suggestions))
+            except Exception as e:
+                print("Failed to build fallback suggestions:", e)
+            await bulk_create_suggestions_async(db, fallback_rows)
+            await enqueue_outbox_async(db, [_queue_payload(a) for a in items])
+
+            # read everything we need before commit expires the rows
+            for i, a in accepted:
+                results[i] = {
+                    "index": i,
+                    "ok": True,
+                    "activity_id": a.id,
+                    "co2_kg": a.co2_kg,
+                    "calculation_source": a.calculation_source
+                }
+
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        for user_id in {a.user_id for a in items}:
+            await bump_user_async(user_id)
+        outbox.nudge()
+
+    return {
+        "accepted": len(accepted),
+        "rejected": len(payload.items) - len(accepted),
+        "results": results
+    }
+
 # --------------------------------------------------
 # List Activities
 # --------------------------------------------------
 
 @router.get("/", response_model=List[ActivityOutFull])
-def list_activities(
-    limit: int = 50,
-    db: Session = Depends(get_db)
+async def list_activities(
+    response: Response,
+    user_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current: Optional[str] = Depends(current_user)
 ):
     """
-    List recent activities.
+    List recent activities, newest first, optionally for one user
+    (with a token: only that token's user).
+    When more exist, X-Next-Cursor holds the cursor for the next page.
     """
-    return (
-        db.query(Activity)
-        .order_by(Activity.created_at.desc())
-        .limit(limit)
-        .all()
+    if current is not None:
+        check_user(current, user_id or current)
+        user_id = current
+    stmt = select(Activity)
+    if user_id:
+        stmt = stmt.where(Activity.user_id == user_id)
+    try:
+        stmt = apply_keyset(stmt, Activity.created_at, Activity.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await db.execute(stmt)
+    rows, next_cursor = split_page(result.scalars().all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+# --------------------------------------------------
+# Export History (streaming)
+# --------------------------------------------------
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_ndjson(columns: List[str], rows) -> str:
+    return "".join(
+        json.dumps({c: _export_value(v) for c, v in zip(columns, row)}) + "\n"
+        for row in rows
     )
+
+
+def _encode_csv(rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerows([[_export_value(v) for v in row] for row in rows])
+    return buf.getvalue()
+
+
+@router.get("/export")
+async def export_history(
+    user_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    kind: str = Query("activities", pattern="^(activities|suggestions)$"),
+    current: Optional[str] = Depends(current_user),
+):
+    """
+    Stream a user's full activity or suggestion history as NDJSON or CSV.
+    Rows come off a server-side cursor in chunks of EXPORT_CHUNK_ROWS, so
+    memory stays flat and the first bytes go out before the query finishes.
+    """
+    check_user(current, user_id)
+    model, columns = EXPORT_COLUMNS[kind]
+    stmt = (
+        select(*[getattr(model, c) for c in columns])
+        .where(model.user_id == user_id)
+        .order_by(model.created_at, model.id)
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    )
+
+    async def body():
+        if format == "csv":
+            yield _encode_csv([columns])
+        # own session: request dependencies are closed before streaming ends
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt)
+            async for chunk in result.partitions():
+                yield _encode_csv(chunk) if format == "csv" else _encode_ndjson(columns, chunk)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'}
+    )
+
@@ -1,10 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
-from app.db.session import SessionLocal
-from app.db.crud import create_user, get_user_by_username
+from app.db.session import AsyncSessionLocal
+from app.db.models import User
+from app.db.crud import create_user_async, get_user_by_username_async
+from app.services.tokens import issue_token, verify_token, TOKEN_TTL, TOKENS_ENABLED
 
 router = APIRouter(prefix="/auth")
 
+# reject requests without a valid token (off by default while clients migrate)
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false") == "true"
+if AUTH_REQUIRED and not TOKENS_ENABLED:
+    raise RuntimeError("AUTH_REQUIRED=true needs AUTH_SECRET (shared by every worker) to sign tokens")
+if not TOKENS_ENABLED:
+    print("AUTH_SECRET not set: login will not issue tokens and Bearer tokens are rejected")
+
+# bcrypt gets its own small pool so a login burst can't starve the request threadpool
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
 class RegisterIn(BaseModel):
     username: str
     password: str
@@ -13,21 +30,58 @@ class LoginIn(BaseModel):
     username: str
     password: str
 
-def get_db():
-    db = SessionLocal()
-    try: yield db
-    finally: db.close()
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def _bcrypt(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, fn, *args)
+
+# --------------------------------------------------
+# Token dependencies
+# --------------------------------------------------
+
+def current_user(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """
+    user_id from an `Authorization: Bearer <token>` header. A bad token is
+    always a 401; a missing one only when AUTH_REQUIRED.
+    """
+    if not authorization:
+        if AUTH_REQUIRED:
+            raise HTTPException(401, "Missing token", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    scheme, _, token = authorization.partition(" ")
+    user_id = verify_token(token) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(401, "Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+def check_user(current: Optional[str], user_id: str):
+    if current is not None and current != user_id:
+        raise HTTPException(403, "Token does not match user_id")
+
+def authorize_user(user_id: str, current: Optional[str] = Depends(current_user)):
+    """For routes with a {user_id} path parameter."""
+    check_user(current, user_id)
+
+# --------------------------------------------------
+# Routes
+# --------------------------------------------------
 
 @router.post("/register")
-def register(data: RegisterIn, db=Depends(get_db)):
-    if get_user_by_username(db, data.username):
+async def register(data: RegisterIn, db=Depends(get_db)):
+    if await get_user_by_username_async(db, data.username):
         raise HTTPException(400, "Username already exists")
-    user = create_user(db, data.username, data.password)
+    hashed = await _bcrypt(User.hash_password, data.password)
+    user = await create_user_async(db, data.username, hashed)
     return {"id": user.id, "username": user.username}
 
 @router.post("/login")
-def login(data: LoginIn, db=Depends(get_db)):
-    user = get_user_by_username(db, data.username)
-    if not user or not user.verify_password(data.password):
+async def login(data: LoginIn, db=Depends(get_db)):
+    user = await get_user_by_username_async(db, data.username)
+    if not user or not await _bcrypt(user.verify_password, data.password):
         raise HTTPException(401, "Invalid credentials")
-    return {"message": "Login success", "user_id": user.username}
+    body = {"message": "Login success", "user_id": user.username}
+    if TOKENS_ENABLED:
+        body.update(access_token=issue_token(user.username), token_type="bearer", expires_in=TOKEN_TTL)
+    return body
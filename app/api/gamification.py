@@ -1,38 +1,73 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
 from app.db.models import UserStats
+from app.services.response_cache import cached
+from app.services.leaderboard import leaderboard, ensure_fresh
+from app.api.auth import authorize_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@router.get("/users/{user_id}")
-def get_user_gamification(user_id: str, db: Session = Depends(get_db)):
-    stat = (
-        db.query(UserStats)
-        .filter(UserStats.user_id == user_id)
-        .order_by(UserStats.date.desc())
-        .first()
-    )
-
-    if not stat:
+@router.get("/users/{user_id}", dependencies=[Depends(authorize_user)])
+async def get_user_gamification(user_id: str):
+    async def load(db: AsyncSession):
+        result = await db.execute(
+            select(UserStats)
+            .where(UserStats.user_id == user_id)
+            .order_by(UserStats.date.desc())
+            .limit(1)
+        )
+        stat = result.scalars().first()
+
+        if not stat:
+            return {
+                "user_id": user_id,
+                "points": 0,
+                "streak": 0,
+                "daily_co2_kg": 0.0
+            }
+
         return {
             "user_id": user_id,
-            "points": 0,
-            "streak": 0,
-            "daily_co2_kg": 0.0
+            "date": stat.date.isoformat() if stat.date else None,
+            "points": stat.points,
+            "streak": stat.streak,
+            "daily_co2_kg": stat.daily_co2_kg
         }
 
+    return await cached("gamification.user", user_id, None, load, consumer_written=True)
+
+BOARD_PATTERN = "^(daily|weekly|alltime)$"
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    k: int = Query(10, ge=1, le=100),
+    board: str = Query("daily", pattern=BOARD_PATTERN),
+):
+    await ensure_fresh(AsyncSessionLocal)
+    entries, total = leaderboard.top(board, k)
+    return {
+        "board": board,
+        "day": leaderboard.day.isoformat(),
+        "total_users": total,
+        "entries": [
+            {"rank": rank, "user_id": user_id, "points": points}
+            for rank, user_id, points in entries
+        ]
+    }
+
+@router.get("/users/{user_id}/rank", dependencies=[Depends(authorize_user)])
+async def get_user_rank(
+    user_id: str,
+    board: str = Query("daily", pattern=BOARD_PATTERN),
+):
+    await ensure_fresh(AsyncSessionLocal)
+    rank, points, total = leaderboard.rank(board, user_id)
     return {
         "user_id": user_id,
-        "date": stat.date,
-        "points": stat.points,
-        "streak": stat.streak,
-        "daily_co2_kg": stat.daily_co2_kg
+        "board": board,
+        "rank": rank,
+        "points": points or 0,
+        "total_users": total
     }
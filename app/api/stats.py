@@ -1,41 +1,43 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from datetime import datetime
-from app.db.session import SessionLocal
-from app.db.models import Activity, UserStats
+from app.db.models import UserDailyRollup, UserStats
+from app.services.response_cache import cached
+from app.api.auth import authorize_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # -------- Today summary ----------
-@router.get("/summary/{user_id}")
-def summary(user_id: str, db: Session = Depends(get_db)):
+@router.get("/summary/{user_id}", dependencies=[Depends(authorize_user)])
+async def summary(user_id: str):
     today = datetime.utcnow().date()
-    total = db.query(func.sum(Activity.co2_kg)).filter(
-        Activity.user_id == user_id,
-        func.date(Activity.created_at) == today
-    ).scalar()
-    return {"today_co2": round(float(total or 0), 2)}
+
+    async def load(db: AsyncSession):
+        total = await db.scalar(select(func.sum(UserDailyRollup.co2_kg)).where(
+            UserDailyRollup.user_id == user_id,
+            UserDailyRollup.day == today
+        ))
+        return {"today_co2": round(float(total or 0), 2)}
+
+    return await cached("stats.summary", user_id, today, load)
 
 # -------- Gamification stats ----------
-@router.get("/user-stats/{user_id}")
-def user_stats(user_id: str, db: Session = Depends(get_db)):
-    row = db.query(UserStats).filter(
-        UserStats.user_id == user_id
-    ).order_by(UserStats.date.desc()).first()
-
-    if not row:
-        return {"user_id": user_id, "points": 0, "streak": 0}
-
-    return {
-        "user_id": row.user_id,
-        "points": row.points,
-        "streak": row.streak
-    }
+@router.get("/user-stats/{user_id}", dependencies=[Depends(authorize_user)])
+async def user_stats(user_id: str):
+    async def load(db: AsyncSession):
+        result = await db.execute(select(UserStats).where(
+            UserStats.user_id == user_id
+        ).order_by(UserStats.date.desc()).limit(1))
+        row = result.scalars().first()
+
+        if not row:
+            return {"user_id": user_id, "points": 0, "streak": 0}
+
+        return {
+            "user_id": row.user_id,
+            "points": row.points,
+            "streak": row.streak
+        }
+
+    return await cached("stats.user_stats", user_id, None, load, consumer_written=True)
@@ -1,9 +1,13 @@
 # backend/app/api/suggestions.py
-from fastapi import APIRouter, Depends
-from app.db.session import SessionLocal
-from app.db.crud import get_suggestions_for_user
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.crud import get_suggestions_for_user_async
+from app.db.pagination import MAX_PAGE_SIZE
+from app.services.response_cache import cached
+from app.api.auth import authorize_user
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 router = APIRouter()
@@ -18,14 +22,30 @@ class SuggestionOut(BaseModel):
     source: str
     created_at: datetime
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@router.get("/users/{user_id}", response_model=List[SuggestionOut], dependencies=[Depends(authorize_user)])
+async def suggestions_for_user(
+    user_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """
+    Newest-first suggestions. When more exist, X-Next-Cursor holds the
+    cursor for the next page.
+    """
+    async def load(db: AsyncSession):
+        rows, next_cursor = await get_suggestions_for_user_async(
+            db, user_id=user_id, limit=limit, cursor=cursor
+        )
+        return {
+            "rows": jsonable_encoder([SuggestionOut.model_validate(r, from_attributes=True) for r in rows]),
+            "next_cursor": next_cursor
+        }
 
-@router.get("/users/{user_id}", response_model=List[SuggestionOut])
-def suggestions_for_user(user_id: str, db=Depends(get_db)):
-    rows = get_suggestions_for_user(db, user_id=user_id)
-    return rows
+    try:
+        page = await cached("suggestions.user", user_id, [limit, cursor], load, consumer_written=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["rows"]
@@ -1,61 +1,117 @@
 # backend/app/api/summary.py
 from fastapi import APIRouter, Depends, Query
-from datetime import datetime, timedelta
-from typing import Dict, Any
-from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import SessionLocal
-from app.db.models import Activity
+from app.db.session import AsyncSessionLocal
+from app.db.crud import rollup_totals_async, bucket_start
+from app.services.response_cache import cached
+from app.api.auth import authorize_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def _period_start(period: str) -> datetime:
-    now = datetime.utcnow()
+def _period_start(period: str) -> date:
+    # whole UTC days, since totals come from the daily rollup
+    today = datetime.utcnow().date()
     if period == "day":
-        return now - timedelta(days=1)
+        return today
     if period == "week":
-        return now - timedelta(weeks=1)
+        return today - timedelta(days=6)
     if period == "month":
-        return now - timedelta(days=30)
-    return now - timedelta(days=1)
+        return today - timedelta(days=29)
+    return today
 
-@router.get("/users/{user_id}")
-def user_summary(
+@router.get("/users/{user_id}", dependencies=[Depends(authorize_user)])
+async def user_summary(
     user_id: str,
     period: str = Query("day", pattern="^(day|week|month)$"),
-    db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
     start = _period_start(period)
-    rows = (
-        db.query(Activity)
-        .filter(Activity.user_id == user_id, Activity.created_at >= start)
-        .all()
-    )
 
-    total = sum(float(r.co2_kg) for r in rows)
+    async def load(db: AsyncSession):
+        rows = await rollup_totals_async(db, user_id, start, by_source=True)
+
+        total = 0.0
+        activity_count = 0
+        by_type: Dict[str, float] = {}
+        by_source: Dict[str, float] = {}
+        for r in rows:
+            total += r["co2_kg"]
+            activity_count += r["activity_count"]
+            by_type[r["type"]] = by_type.get(r["type"], 0.0) + r["co2_kg"]
+            src = r["calculation_source"]
+            by_source[src] = by_source.get(src, 0.0) + r["co2_kg"]
+
+        return {
+            "user_id": user_id,
+            "period": period,
+            "start": datetime.combine(start, datetime.min.time()).isoformat(),
+            "activity_count": activity_count,
+            "total_kg": total,
+            "breakdown_by_type": by_type,
+            "breakdown_by_source": by_source,
+        }
+
+    return await cached("summary.user", user_id, [period, start], load)
+
+ACTIVITY_TYPES = ["travel", "electricity", "food"]
+
+def _bucket_labels(start: date, end: date, bucket: str) -> List[date]:
+    labels = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        labels.append(current)
+        if bucket == "day":
+            current += timedelta(days=1)
+        elif bucket == "week":
+            current += timedelta(weeks=1)
+        else:
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return labels
+
+@router.get("/users/{user_id}/timeseries", dependencies=[Depends(authorize_user)])
+async def user_timeseries(
+    user_id: str,
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    days: int = Query(90, ge=1, le=366),
+    db: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    CO2 per bucket and activity type over the last `days` days, bucketed in
+    SQL. Arrays are dense (zero-filled) and aligned with `labels`.
+    """
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    rows = await rollup_totals_async(db, user_id, start, end, bucket=bucket)
+
+    labels = _bucket_labels(start, end, bucket)
+    position = {label: i for i, label in enumerate(labels)}
+    types = ACTIVITY_TYPES + sorted({r["type"] for r in rows} - set(ACTIVITY_TYPES))
+    series = {t: [0.0] * len(labels) for t in types}
+    counts = [0] * len(labels)
 
-    by_type: Dict[str, float] = {}
-    by_source: Dict[str, float] = {}
     for r in rows:
-        by_type[r.type] = by_type.get(r.type, 0.0) + float(r.co2_kg)
-        src = r.calculation_source or "local_factors"
-        by_source[src] = by_source.get(src, 0.0) + float(r.co2_kg)
+        i = position.get(r["bucket"])
+        if i is None:
+            continue
+        series[r["type"]][i] += r["co2_kg"]
+        counts[i] += r["activity_count"]
 
-    activity_count = len(rows)
+    totals = [round(sum(values), 4) for values in zip(*series.values())] if labels else []
 
     return {
         "user_id": user_id,
-        "period": period,
+        "bucket": bucket,
         "start": start.isoformat(),
-        "activity_count": activity_count,
-        "total_kg": total,
-        "breakdown_by_type": by_type,
-        "breakdown_by_source": by_source,
+        "end": end.isoformat(),
+        "labels": [label.isoformat() for label in labels],
+        "series": {t: [round(v, 4) for v in values] for t, values in series.items()},
+        "total_kg": totals,
+        "activity_count": counts,
     }
+
@@ -1,46 +1,208 @@
 # backend/app/db/crud.py
 from sqlalchemy.orm import Session
-from app.db.models import Suggestion, Activity
-from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import Suggestion, Activity, UserDailyRollup, OutboxEvent
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, select, delete, func, cast, Date
+from sqlalchemy.dialects import postgresql, sqlite
 from app.db.models import User
+from app.db.pagination import apply_keyset, split_page
 
-def create_suggestion(db: Session, user_id: str, activity_id: int, text: str,
-                      est_saving: float=None, difficulty: str=None, meta: dict=None, source: str="fallback"):
-    s = Suggestion(
-        activity_id=activity_id,
-        user_id=user_id,
-        suggestion_text=text,
-        est_saving_kg=est_saving,
-        difficulty=difficulty,
-        meta=meta or {},
-        source=source
+def _suggestion_rows(rows: list) -> list:
+    return [
+        {
+            "activity_id": r["activity_id"],
+            "user_id": r["user_id"],
+            "suggestion_text": r["text"],
+            "est_saving_kg": r.get("est_saving"),
+            "difficulty": r.get("difficulty"),
+            "meta": r.get("meta") or {},
+            "source": r.get("source", "fallback"),
+            "created_at": datetime.utcnow(),
+        }
+        for r in rows
+    ]
+
+def bulk_create_suggestions(db: Session, rows: list):
+    # multi-row insert; caller owns the transaction (no commit here)
+    if not rows:
+        return
+    db.execute(insert(Suggestion), _suggestion_rows(rows))
+
+# the web app's placeholder and everything the consumer writes
+REPLACED_SOURCES = ("fallback", "ai", "rule")
+
+def delete_suggestions_for_activities(db: Session, activity_ids: list):
+    # caller owns the transaction (no commit here)
+    if not activity_ids:
+        return
+    db.execute(
+        delete(Suggestion).where(
+            Suggestion.activity_id.in_(activity_ids),
+            Suggestion.source.in_(REPLACED_SOURCES)
+        )
     )
-    db.add(s)
-    db.commit()
-    db.refresh(s)
-    return s
 
-def get_suggestions_for_user(db: Session, user_id: str, limit: int=50):
-    return db.query(Suggestion).filter(Suggestion.user_id==user_id).order_by(Suggestion.created_at.desc()).limit(limit).all()
 
-def delete_fallback_suggestions_for_activity(db: Session, activity_id: int):
-    # remove fallback suggestions for a given activity_id
+def replace_suggestions_for_activities(db: Session, activity_ids: list, rows: list, commit: bool = True):
+    """
+    Swap the suggestions of these activities for `rows`: one DELETE and one
+    multi-row INSERT in a single transaction. Earlier consumer-written rows
+    go too, so a redelivered message replaces its suggestions instead of
+    adding a second copy.
+    """
     try:
-        db.execute(text("DELETE FROM suggestions WHERE activity_id = :aid AND source = 'fallback'"), {"aid": activity_id})
-        db.commit()
-    except Exception as e:
-        print("Failed to delete fallback suggestions:", e)
+        delete_suggestions_for_activities(db, activity_ids)
+        bulk_create_suggestions(db, rows)
+        if commit:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+# --------------------------------------------------
+# Daily rollup
+# --------------------------------------------------
+
+def _upsert_insert(db, table):
+    """Dialect-specific INSERT that supports ON CONFLICT."""
+    name = db.bind.dialect.name
+    if name == "postgresql":
+        return postgresql.insert(table)
+    if name == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"upsert not supported on {name}")
+
+def rollup_rows(activities: list) -> list:
+    # pre-aggregate so one statement never touches the same key twice
+    totals = {}
+    for a in activities:
+        key = (a.user_id, a.created_at.date(), a.type, a.calculation_source or "local_factors")
+        co2, count = totals.get(key, (0.0, 0))
+        totals[key] = (co2 + float(a.co2_kg), count + 1)
+    return [
+        {
+            "user_id": user_id,
+            "day": day,
+            "type": typ,
+            "calculation_source": src,
+            "co2_kg": co2,
+            "activity_count": count,
+        }
+        for (user_id, day, typ, src), (co2, count) in totals.items()
+    ]
+
+def _rollup_upsert_stmt(db, rows: list):
+    stmt = _upsert_insert(db, UserDailyRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "type", "calculation_source"],
+        set_={
+            "co2_kg": UserDailyRollup.co2_kg + stmt.excluded.co2_kg,
+            "activity_count": UserDailyRollup.activity_count + stmt.excluded.activity_count,
+        },
+    )
+
+# --------------------------------------------------
+# Async variants (web routers)
+# --------------------------------------------------
 
+async def bulk_create_suggestions_async(db: AsyncSession, rows: list):
+    # multi-row insert; caller owns the transaction (no commit here)
+    if not rows:
+        return
+    await db.execute(insert(Suggestion), _suggestion_rows(rows))
 
+async def upsert_daily_rollup_async(db: AsyncSession, activities: list):
+    # caller owns the transaction; activities must be flushed (created_at set)
+    rows = rollup_rows(activities)
+    if rows:
+        await db.execute(_rollup_upsert_stmt(db, rows))
 
-def create_user(db, username: str, password: str):
-    hashed = User.hash_password(password)
-    user = User(username=username, password_hash=hashed)
+async def enqueue_outbox_async(db: AsyncSession, payloads: list):
+    # caller owns the transaction: rows commit (or roll back) with the activities
+    if payloads:
+        await db.execute(insert(OutboxEvent), [{"payload": p} for p in payloads])
+
+def _bucket_expr(dialect_name: str, bucket: str):
+    """SQL expression mapping UserDailyRollup.day to the start of its bucket."""
+    day = UserDailyRollup.day
+    if bucket == "day":
+        return day
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc(bucket, day), Date)
+    if dialect_name == "sqlite":
+        if bucket == "week":
+            return func.date(day, "weekday 0", "-6 days")  # Monday
+        return func.strftime("%Y-%m-01", day)
+    raise NotImplementedError(f"bucketing not supported on {dialect_name}")
+
+def bucket_start(d: date, bucket: str) -> date:
+    """Python twin of _bucket_expr (ISO weeks start on Monday)."""
+    if bucket == "week":
+        return d - timedelta(days=d.weekday())
+    if bucket == "month":
+        return d.replace(day=1)
+    return d
+
+async def rollup_totals_async(db: AsyncSession, user_id: str, start: date, end: date = None,
+                              bucket: str = None, by_source: bool = False) -> list:
+    """
+    Sum rollup rows for [start, end] grouped by type, plus the bucket
+    (day/week/month, computed in SQL) and/or calculation_source when asked.
+    Rows are dicts with keys bucket?, type, calculation_source?, co2_kg, activity_count.
+    """
+    keys = []
+    cols = []
+    if bucket:
+        keys.append("bucket")
+        cols.append(_bucket_expr(db.bind.dialect.name, bucket).label("bucket"))
+    keys.append("type")
+    cols.append(UserDailyRollup.type)
+    if by_source:
+        keys.append("calculation_source")
+        cols.append(UserDailyRollup.calculation_source)
+
+    stmt = (
+        select(
+            *cols,
+            func.sum(UserDailyRollup.co2_kg),
+            func.sum(UserDailyRollup.activity_count),
+        )
+        .where(UserDailyRollup.user_id == user_id, UserDailyRollup.day >= start)
+        .group_by(*cols)
+    )
+    if end:
+        stmt = stmt.where(UserDailyRollup.day <= end)
+
+    rows = []
+    for row in (await db.execute(stmt)).all():
+        item = dict(zip(keys, row[:len(keys)]))
+        if bucket:
+            # date on Postgres, 'YYYY-MM-DD' text on SQLite
+            item["bucket"] = date.fromisoformat(str(item["bucket"])[:10])
+        item["co2_kg"] = float(row[-2] or 0)
+        item["activity_count"] = int(row[-1] or 0)
+        rows.append(item)
+    return rows
+
+async def get_suggestions_for_user_async(db: AsyncSession, user_id: str, limit: int=50, cursor: str=None):
+    """Newest-first page of suggestions; returns (rows, next_cursor)."""
+    stmt = apply_keyset(
+        select(Suggestion).where(Suggestion.user_id == user_id),
+        Suggestion.created_at, Suggestion.id, limit, cursor
+    )
+    result = await db.execute(stmt)
+    return split_page(result.scalars().all(), limit)
+
+async def create_user_async(db: AsyncSession, username: str, password_hash: str):
+    user = User(username=username, password_hash=password_hash)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
-def get_user_by_username(db, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
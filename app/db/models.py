@@ -1,13 +1,16 @@
 # backend/app/db/models.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, JSON, Text, Index, and_
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from passlib.context import CryptContext
+import os
 
 Base = declarative_base()
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# cost factor: each +1 doubles hashing time (12 is ~250 ms)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 class User(Base):
     __tablename__ = "users"
@@ -27,7 +30,7 @@ class User(Base):
 class Activity(Base):
     __tablename__ = "activities"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True)
+    user_id = Column(String)
     type = Column(String, index=True)
     mode = Column(String, nullable=True)
     distance_km = Column(Float, nullable=True)
@@ -38,11 +41,16 @@ class Activity(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     meta = Column(JSON, nullable=True)
 
+    __table_args__ = (
+        Index("ix_activities_user_id_created_at_id", user_id, created_at, id),
+        Index("ix_activities_created_at_id", created_at, id),
+    )
+
 class Suggestion(Base):
     __tablename__ = "suggestions"
     id = Column(Integer, primary_key=True, index=True)
     activity_id = Column(Integer, nullable=True)                # link to Activity (optional)
-    user_id = Column(String, index=True)
+    user_id = Column(String)
     suggestion_text = Column(Text, nullable=False)
     est_saving_kg = Column(Float, nullable=True)
     difficulty = Column(String, nullable=True)                  # easy/medium/hard
@@ -50,11 +58,16 @@ class Suggestion(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     meta = Column(JSON, nullable=True)
 
+    __table_args__ = (
+        Index("ix_suggestions_user_id_created_at_id", user_id, created_at.desc(), id.desc()),
+        Index("ix_suggestions_activity_id_source", activity_id, source),
+    )
+
 class UserStats(Base):
     __tablename__ = "user_stats"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True, nullable=False)
+    user_id = Column(String, nullable=False)
     date = Column(DateTime, index=True, nullable=False)
 
     daily_co2_kg = Column(Float, nullable=False)
@@ -62,4 +75,44 @@ class UserStats(Base):
     streak = Column(Integer, default=0)
 
     created_at = Column(DateTime, default=datetime.utcnow)
+    # set on every write; the web process's leaderboard pulls rows past its watermark
+    updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ux_user_stats_user_id_date", user_id, date, unique=True),
+        Index("ix_user_stats_updated_at", updated_at),
+    )
+
+class UserDailyRollup(Base):
+    """Per-user daily CO2 totals, upserted in the same transaction as each Activity."""
+    __tablename__ = "user_daily_rollup"
+
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    type = Column(String, primary_key=True)
+    calculation_source = Column(String, primary_key=True)
+
+    co2_kg = Column(Float, nullable=False, default=0.0)
+    activity_count = Column(Integer, nullable=False, default=0)
+
+
+class OutboxEvent(Base):
+    """Activity messages waiting to be relayed to RabbitMQ; written in the activity's transaction."""
+    __tablename__ = "activity_outbox"
+
+    id = Column(Integer, primary_key=True)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # set once attempts reach OUTBOX_MAX_ATTEMPTS: parked, no longer relayed
+    failed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # the relay only ever scans unsent, unparked rows
+        Index(
+            "ix_activity_outbox_pending", id,
+            postgresql_where=and_(sent_at.is_(None), failed_at.is_(None)),
+            sqlite_where=and_(sent_at.is_(None), failed_at.is_(None)),
+        ),
+    )
@@ -0,0 +1,43 @@
+# backend/app/db/pagination.py
+"""
+Opaque keyset cursors over (created_at, id), newest first.
+
+A cursor encodes the last row of the previous page; the next page is every
+row strictly "older" than it, so deep pages cost the same as the first one
+given an index on (..., created_at, id).
+"""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def apply_keyset(stmt, created_col, id_col, limit: int, cursor: Optional[str] = None):
+    """Order newest-first, skip past `cursor`, and fetch one extra row to detect a next page."""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+def split_page(rows: list, limit: int):
+    """Trim the look-ahead row; returns (page, next_cursor or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.created_at, last.id)
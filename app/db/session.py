@@ -2,7 +2,10 @@
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
+from app.services.metrics import instrument_engine
+from app.services import sql_profiler
 
 load_dotenv() 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -29,7 +32,45 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --------------------------------------------------
+# Async engine (web routers)
+# --------------------------------------------------
+
+def _async_url(url: str) -> str:
+    """Map the sync DATABASE_URL onto its async driver."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True
+)
+
+# query counts/timings and pool checkout wait for /metrics
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+# request-id tagging, slow-query log, N+1 detection (SQL_PROFILE=true)
+sql_profiler.install(engine)
+sql_profiler.install(async_engine.sync_engine)
+
+# expire_on_commit=False: rows stay readable after commit without
+# an implicit (and, under asyncio, illegal) lazy refresh
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def init_db():
-    """Create tables if they don't exist."""
+    """
+    Create tables if they don't exist. Dev/test convenience only;
+    deployed databases are migrated with `alembic upgrade head`.
+    """
     from .models import Base
     Base.metadata.create_all(bind=engine)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import activities
@@ -7,14 +7,36 @@ from app.api import gamification
 from app.api import auth
 from contextlib import asynccontextmanager
 from app.api import stats
-from app.db.session import init_db
+from app.db.session import async_engine, AsyncSessionLocal
+from app.services.messaging import close_publisher
+from app.services.climatiq import aclose_clients
+from app.services.leaderboard import ensure_fresh, refresh_forever
+from app.services import outbox
+from app.services.metrics import MetricsMiddleware, render as render_metrics
+from app.services import sql_profiler
+from app.services.response_cache import get_backend as response_cache_backend
+import asyncio
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    init_db()
+    # Startup (schema is managed by Alembic: `alembic upgrade head`)
+    response_cache_backend()   # warns here if the cache can't see consumer writes
+    try:
+        await ensure_fresh(AsyncSessionLocal)
+    except Exception as e:
+        print("Leaderboard build failed, will retry on first request:", e)
+    tasks = [asyncio.create_task(refresh_forever(AsyncSessionLocal))]
+    if outbox.RELAY_IN_PROCESS:
+        tasks.append(asyncio.create_task(outbox.relay_forever()))
     yield
+    # Shutdown
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    close_publisher()
+    await aclose_clients()
+    await async_engine.dispose()
 
 app = FastAPI(title="Carbon Tracker API",lifespan=lifespan)
 
@@ -26,6 +48,9 @@ app.add_middleware(
     allow_methods=["*"],            # allow POST/OPTIONS/etc.
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+if sql_profiler.ENABLED:
+    app.add_middleware(sql_profiler.ProfilerMiddleware)
 
 app.include_router(auth.router)
 app.include_router(activities.router, prefix="/activities",tags=["activities"])
@@ -36,6 +61,10 @@ app.include_router(stats.router)
 
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 def health():
     return {"status": "ok", "service": "carbon-tracker"}
\ No newline at end of file
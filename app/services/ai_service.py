@@ -160,12 +160,17 @@
 # (Cloud)backend/app/services/ai_service.py
 
 from typing import List, Dict, Any
-import os, json
+import os, json, asyncio
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
+from sqlalchemy import func
+
 from app.db.session import SessionLocal
-from app.db.models import Activity, UserStats
+from app.db.models import UserDailyRollup, UserStats
+from app.services import suggestion_cache
+from app.services import gemini
+from app.services import rules
 
 # -------------------------------------------------
 # Environment
@@ -180,128 +185,18 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 # -------------------------------------------------
 
 USE_GEMINI = True   # ✅ turn ON only when quota allows
-MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+MODEL = gemini.MODEL
 
 # -------------------------------------------------
 # FALLBACK RULE-BASED SUGGESTIONS
 # -------------------------------------------------
 
 def rule_based_suggestions(activity: Dict[str, Any]) -> List[Dict[str, Any]]:
-    suggestions = []
-    typ = activity.get("type")
-
-    # -----------------------
-    # TRAVEL
-    # -----------------------
-    if typ == "travel":
-        mode = (activity.get("mode") or "").lower()
-        d = float(activity.get("distance_km") or 0)
-
-        if mode in ["bike", "bicycle", "cycle"]:
-            suggestions.append({
-                "text": f"Cycling for {d:.1f} km is a low-carbon choice. Keep using it for short daily trips.",
-                "difficulty": "easy"
-            })
-            suggestions.append({
-                "text": "You could replace another short trip this week with cycling to maintain this habit.",
-                "difficulty": "easy"
-            })
-
-        elif mode == "walk":
-            suggestions.append({
-                "text": "Walking produces almost zero emissions. Consider using it for all trips under 2 km.",
-                "difficulty": "easy"
-            })
-
-        elif mode == "train":
-            suggestions.append({
-                "text": f"Train travel has lower emissions per km. Continue using it for medium-distance travel.",
-                "difficulty": "easy"
-            })
-
-        elif mode == "bus":
-            suggestions.append({
-                "text": "Public transport reduces per-person emissions. Prefer buses over private vehicles when possible.",
-                "difficulty": "easy"
-            })
-
-        elif mode in ["car", "motorbike"]:
-            if d <= 5:
-                suggestions.append({
-                    "text": f"For trips under {int(d)} km, walking or cycling could fully avoid emissions.",
-                    "difficulty": "easy"
-                })
-            elif d <= 15:
-                suggestions.append({
-                    "text": "For medium trips, carpooling or public transport can reduce emissions significantly.",
-                    "difficulty": "medium"
-                })
-            else:
-                suggestions.append({
-                    "text": "For long trips, combining errands into one journey can lower total emissions.",
-                    "difficulty": "medium"
-                })
-
-    # -----------------------
-    # ELECTRICITY
-    # -----------------------
-    elif typ == "electricity":
-        kwh = float(activity.get("kwh") or 0)
-
-        if kwh <= 2:
-            suggestions.append({
-                "text": "Your electricity usage is relatively low. Continue switching off unused devices.",
-                "difficulty": "easy"
-            })
-        elif kwh <= 6:
-            suggestions.append({
-                "text": "Reducing standby power and using LED lighting can cut daily electricity usage.",
-                "difficulty": "easy"
-            })
-        else:
-            suggestions.append({
-                "text": "High electricity usage detected. Limiting AC usage and unplugging idle devices can help.",
-                "difficulty": "medium"
-            })
-
-    # -----------------------
-    # FOOD
-    # -----------------------
-    elif typ == "food":
-        cat = (activity.get("food_category") or "").lower()
-
-        if cat == "veg":
-            suggestions.append({
-                "text": "Vegetarian meals have lower carbon impact. Maintaining this diet reduces emissions.",
-                "difficulty": "easy"
-            })
-            suggestions.append({
-                "text": "You could explore locally sourced vegetables to reduce transport emissions further.",
-                "difficulty": "easy"
-            })
-
-        elif cat == "chicken":
-            suggestions.append({
-                "text": "Chicken has lower emissions than red meat. Replacing some meals with vegetarian options helps more.",
-                "difficulty": "medium"
-            })
-
-        elif cat == "beef":
-            suggestions.append({
-                "text": "Beef has a high carbon footprint. Replacing even one meal with plant-based food helps.",
-                "difficulty": "hard"
-            })
-
-    # -----------------------
-    # FALLBACK
-    # -----------------------
-    if not suggestions:
-        suggestions.append({
-            "text": "Small daily choices like saving energy and reducing travel add up over time.",
-            "difficulty": "easy"
-        })
-
-    return suggestions[:2]  # always return max 2
+    # compiled rule table, see app/services/rules.py
+    return rules.get_engine().evaluate(activity)
+
+def rule_based_suggestions_batch(activities: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    return rules.get_engine().evaluate_many(activities)
 
 
 # -------------------------------------------------
@@ -310,21 +205,22 @@ def rule_based_suggestions(activity: Dict[str, Any]) -> List[Dict[str, Any]]:
 
 def get_user_context(user_id: str) -> dict:
     db = SessionLocal()
-    now = datetime.utcnow()
-    week_ago = now - timedelta(days=7)
+    week_start = datetime.utcnow().date() - timedelta(days=6)
 
-    activities = db.query(Activity).filter(
-        Activity.user_id == user_id,
-        Activity.created_at >= week_ago
-    ).all()
+    rows = (
+        db.query(UserDailyRollup.type, func.sum(UserDailyRollup.co2_kg))
+        .filter(
+            UserDailyRollup.user_id == user_id,
+            UserDailyRollup.day >= week_start
+        )
+        .group_by(UserDailyRollup.type)
+        .all()
+    )
 
-    total = sum(float(a.co2_kg) for a in activities)
+    by_type = {typ: float(co2 or 0) for typ, co2 in rows}
+    total = sum(by_type.values())
     avg_daily = round(total / 7, 2)
 
-    by_type = {}
-    for a in activities:
-        by_type[a.type] = by_type.get(a.type, 0) + float(a.co2_kg)
-
     top_type = max(by_type, key=by_type.get) if by_type else "travel"
 
     stats = (
@@ -349,24 +245,11 @@ def get_user_context(user_id: str) -> dict:
 # -------------------------------------------------
 
 def call_gemini(prompt: str) -> str:
-    try:
-        from google import genai
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=prompt,
-            config={
-                "temperature": 0.0,
-                "max_output_tokens": 150
-            }
-        )
-
-        return response.text if hasattr(response, "text") else ""
+    # shared client, rate-limited; "" when busy or failed
+    return gemini.generate(prompt)
 
-    except Exception as e:
-        print("Gemini failed:", e)
-        return ""
+async def call_gemini_async(prompt: str) -> str:
+    return await gemini.generate_async(prompt)
 
 # -------------------------------------------------
 # PROMPT (SAFE & SHORT)
@@ -420,18 +303,50 @@ def parse_model_output(text: str) -> List[Dict[str, Any]]:
 # MAIN ENTRY
 # -------------------------------------------------
 
-def generate_suggestions_for_activity(activity: Dict[str, Any]) -> List[Dict[str, Any]]:
+def generate_suggestions_for_activity(activity: Dict[str, Any], user_ctx: dict = None) -> List[Dict[str, Any]]:
     user_id = activity.get("user_id")
-    user_ctx = get_user_context(user_id) if user_id else {}
+    if user_ctx is None:
+        user_ctx = get_user_context(user_id) if user_id else {}
 
     
     # Do NOT call Gemini again if already attempted
     if USE_GEMINI and not activity.get("ai_attempted"):
+        cache = suggestion_cache.get_cache()
+        key = suggestion_cache.signature(activity, user_ctx, MODEL)
+        cached = cache.get(key)
+        if cached:
+            return cached
+
         prompt = build_prompt(activity, user_ctx)
         text = call_gemini(prompt)
         parsed = parse_model_output(text)
         if parsed:
+            cache.put(key, parsed)
             return parsed
 
 
     return rule_based_suggestions(activity)
+
+
+async def generate_suggestions_for_activity_async(activity: Dict[str, Any], user_ctx: dict = None) -> List[Dict[str, Any]]:
+    """Same as generate_suggestions_for_activity, awaiting Gemini instead of blocking a thread."""
+    user_id = activity.get("user_id")
+    if user_ctx is None:
+        user_ctx = await asyncio.to_thread(get_user_context, user_id) if user_id else {}
+
+    if USE_GEMINI and not activity.get("ai_attempted"):
+        cache = suggestion_cache.get_cache()
+        key = suggestion_cache.signature(activity, user_ctx, MODEL)
+        cached = cache.get(key)
+        if cached:
+            return cached
+
+        prompt = build_prompt(activity, user_ctx)
+        text = await call_gemini_async(prompt)
+        parsed = parse_model_output(text)
+        if parsed:
+            cache.put(key, parsed)
+            return parsed
+
+    return rule_based_suggestions(activity)
+
@@ -0,0 +1,199 @@
+# backend/app/services/climatiq.py
+"""
+Climatiq emission-factor client.
+
+Instead of asking Climatiq to price every activity, we fetch the factor for
+(activity_id, country, region) once - an estimate for one unit of the
+quantity - cache it with a TTL, and multiply locally. Concurrent misses for
+the same key share one HTTP request, whether they come from threads or from
+the event loop.
+"""
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+
+CLIMATIQ_URL = "https://beta3.api.climatiq.io/estimate"
+TIMEOUT = 8  # seconds
+FACTOR_TTL = float(os.getenv("CLIMATIQ_FACTOR_TTL", str(24 * 3600)))
+FAILURE_TTL = float(os.getenv("CLIMATIQ_FAILURE_TTL", "60"))  # don't hammer a failing API
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+# one-unit parameters per quantity kind
+UNIT_PARAMETERS = {
+    "distance": {"distance": 1, "distance_unit": "km"},
+    "energy": {"energy": 1, "energy_unit": "kWh"},
+}
+
+FactorKey = Tuple[str, str, Optional[str], Optional[str]]
+
+def _api_key() -> Optional[str]:
+    return os.getenv("CLIMATIQ_API_KEY")
+
+def _headers():
+    key = _api_key()
+    if key:
+        return {
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json"
+        }
+    return {"Content-Type": "application/json"}
+
+def _payload(key: FactorKey) -> dict:
+    activity_id, kind, country, region = key
+    emission_factor = {"activity_id": activity_id}
+    if region or country:
+        emission_factor["region"] = region or country
+    return {
+        "emission_factor": emission_factor,
+        "parameters": UNIT_PARAMETERS[kind],
+    }
+
+def _parse(response: httpx.Response) -> Optional[float]:
+    if response.is_success:
+        data = response.json()
+        if "co2e" in data:
+            return float(data["co2e"])
+    print("Climatiq factor lookup failed:", response.status_code)
+    return None
+
+# --------------------------------------------------
+# Pooled HTTP clients
+# --------------------------------------------------
+
+_sync_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def _get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _client_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(timeout=TIMEOUT, limits=POOL_LIMITS)
+    return _sync_client
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(timeout=TIMEOUT, limits=POOL_LIMITS)
+    return _async_client
+
+async def aclose_clients():
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _client_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+
+# --------------------------------------------------
+# Factor cache with single-flight
+# --------------------------------------------------
+
+_factors = {}     # key -> (expires_at, factor or None)
+_in_flight = {}   # key -> concurrent.futures.Future
+_lock = threading.Lock()
+
+def _cached(key: FactorKey):
+    item = _factors.get(key)
+    if item and item[0] > time.monotonic():
+        return True, item[1]
+    return False, None
+
+def _claim(key: FactorKey):
+    """Return (future, owner). Only the owner performs the request."""
+    with _lock:
+        hit, factor = _cached(key)
+        if hit:
+            done = Future()
+            done.set_result(factor)
+            return done, False
+        fut = _in_flight.get(key)
+        if fut is not None:
+            return fut, False
+        fut = _in_flight[key] = Future()
+        return fut, True
+
+def _settle(key: FactorKey, fut: Future, factor: Optional[float]):
+    ttl = FACTOR_TTL if factor is not None else FAILURE_TTL
+    with _lock:
+        _factors[key] = (time.monotonic() + ttl, factor)
+        _in_flight.pop(key, None)
+    fut.set_result(factor)
+
+
+class _Abandoned(Exception):
+    """The owner of an in-flight lookup was cancelled; waiters claim the key again."""
+
+def _abandon(key: FactorKey, fut: Future):
+    # nothing is cached: the lookup didn't fail, its owner went away
+    with _lock:
+        _in_flight.pop(key, None)
+    fut.set_exception(_Abandoned())
+
+def get_factor(activity_id: str, kind: str, country: str = None, region: str = None) -> Optional[float]:
+    """kg CO2e per unit (km, kWh), or None if Climatiq is unavailable."""
+    key = (activity_id, kind, country, region)
+    while True:
+        fut, owner = _claim(key)
+        if owner:
+            break
+        try:
+            return fut.result()
+        except _Abandoned:
+            continue
+
+    factor = None
+    try:
+        response = _get_sync_client().post(CLIMATIQ_URL, json=_payload(key), headers=_headers())
+        factor = _parse(response)
+    except Exception as e:
+        print("Climatiq factor lookup failed:", e)
+    except BaseException:
+        _abandon(key, fut)
+        raise
+    _settle(key, fut, factor)
+    return factor
+
+async def get_factor_async(activity_id: str, kind: str, country: str = None, region: str = None) -> Optional[float]:
+    key = (activity_id, kind, country, region)
+    while True:
+        fut, owner = _claim(key)
+        if owner:
+            break
+        try:
+            # shielded: a cancelled waiter must not cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(fut))
+        except _Abandoned:
+            continue
+
+    factor = None
+    try:
+        response = await _get_async_client().post(CLIMATIQ_URL, json=_payload(key), headers=_headers())
+        factor = _parse(response)
+    except Exception as e:
+        print("Climatiq factor lookup failed:", e)
+    except BaseException:
+        # cancelled (e.g. the client disconnected): a waiter retries instead
+        _abandon(key, fut)
+        raise
+    _settle(key, fut, factor)
+    return factor
+
+def clear_factor_cache():
+    with _lock:
+        _factors.clear()
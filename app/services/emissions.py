@@ -1,8 +1,12 @@
 import os
-import requests
 from functools import lru_cache
+from typing import NamedTuple
 from dotenv import load_dotenv
 
+import numpy as np
+
+from app.services import climatiq
+
 # --------------------------------------------------
 # Environment setup
 # --------------------------------------------------
@@ -11,8 +15,10 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../"))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
 CLIMATIQ_KEY = os.getenv("CLIMATIQ_API_KEY")
-CLIMATIQ_URL = "https://beta3.api.climatiq.io/estimate"
-TIMEOUT = 8  # seconds
+
+# Climatiq emission factors (one factor per activity id, cached in climatiq.py)
+CLIMATIQ_TRAVEL_ACTIVITY = "passenger_vehicle-vehicle_type_car-fuel_source_petrol-distance_km"
+CLIMATIQ_ELECTRICITY_ACTIVITY = "electricity-energy_source_grid_mix-energy_unit_kwh"
 
 # --------------------------------------------------
 # Local fallback emission factors (ONLY FALLBACK)
@@ -37,79 +43,25 @@ LOCAL_FOOD = {
     "beef": 27.0
 }
 
-# --------------------------------------------------
-# Helpers
-# --------------------------------------------------
-
-def _headers():
-    if CLIMATIQ_KEY:
-        return {
-            "Authorization": f"Bearer {CLIMATIQ_KEY}",
-            "Content-Type": "application/json"
-        }
-    return {"Content-Type": "application/json"}
-
 # --------------------------------------------------
 # Emission estimators
 # --------------------------------------------------
 
-@lru_cache(maxsize=1024)
-def estimate_travel(mode: str, distance_km: float) -> float:
-    mode = (mode or "car").lower()
+def _local_travel(mode: str, distance_km: float) -> float:
+    factor = LOCAL_TRAVEL_FACTORS.get(mode)
+    if factor is None:
+        raise ValueError(f"Unsupported travel mode: {mode}")
+    return distance_km * factor
 
-    # Fallback
-    if not CLIMATIQ_KEY:
-        factor = LOCAL_TRAVEL_FACTORS.get(mode)
-        if factor is None:
-            raise ValueError(f"Unsupported travel mode: {mode}")
+def _travel_from_factor(mode: str, distance_km: float, factor) -> float:
+    if factor is not None:
         return distance_km * factor
-
-    payload = {
-        "emission_factor": {
-            "activity_id": "passenger_vehicle-vehicle_type_car-fuel_source_petrol-distance_km"
-        },
-        "parameters": {
-            "distance": distance_km,
-            "distance_unit": "km"
-        }
-    }
-
-    try:
-        r = requests.post(CLIMATIQ_URL, json=payload, headers=_headers(), timeout=TIMEOUT)
-        if r.ok:
-            data = r.json()
-            if "co2e" in data:
-                return float(data["co2e"])
-    except Exception:
-        pass
-
     # Fallback if API fails
     return distance_km * LOCAL_TRAVEL_FACTORS.get(mode, LOCAL_TRAVEL_FACTORS["car"])
 
-
-@lru_cache(maxsize=1024)
-def estimate_electricity(kwh: float, country: str = None) -> float:
-    if not CLIMATIQ_KEY:
-        return kwh * LOCAL_ELECTRICITY_FACTOR
-
-    payload = {
-        "emission_factor": {"activity_id": "electricity-energy_source_grid_mix-energy_unit_kwh"},
-        "parameters": {
-            "energy": kwh,
-            "energy_unit": "kWh",
-            "country": country
-        }
-    }
-
-    try:
-        r = requests.post(CLIMATIQ_URL, json=payload, headers=_headers(), timeout=TIMEOUT)
-        if r.ok:
-            data = r.json()
-            if "co2e" in data:
-                return float(data["co2e"])
-    except Exception:
-        pass
-
+def _electricity_from_factor(kwh: float, factor) -> float:
+    if factor is not None:
+        return kwh * factor
     return kwh * LOCAL_ELECTRICITY_FACTOR
 
 
@@ -119,3 +71,120 @@ def estimate_food(category: str) -> float:
 
     # Using only fallback for now (Climatiq food support can be added later)
     return LOCAL_FOOD.get(category, LOCAL_FOOD["veg"])
+
+# --------------------------------------------------
+# Async estimators (request path; no thread needed)
+# --------------------------------------------------
+
+async def estimate_travel_async(mode: str, distance_km: float) -> float:
+    mode = (mode or "car").lower()
+
+    if not CLIMATIQ_KEY:
+        return _local_travel(mode, distance_km)
+
+    factor = await climatiq.get_factor_async(CLIMATIQ_TRAVEL_ACTIVITY, "distance")
+    return _travel_from_factor(mode, distance_km, factor)
+
+
+async def estimate_electricity_async(kwh: float, country: str = None) -> float:
+    if not CLIMATIQ_KEY:
+        return kwh * LOCAL_ELECTRICITY_FACTOR
+
+    factor = await climatiq.get_factor_async(CLIMATIQ_ELECTRICITY_ACTIVITY, "energy", country=country)
+    return _electricity_from_factor(kwh, factor)
+
+# --------------------------------------------------
+# Batch (columnar) estimator
+# --------------------------------------------------
+
+class BatchEstimate(NamedTuple):
+    co2_kg: np.ndarray   # float64, NaN where the row failed
+    errors: np.ndarray   # object, None or an error message per row
+
+
+def _column(values, n: int, dtype=object) -> np.ndarray:
+    if values is None:
+        return np.full(n, None if dtype is object else np.nan, dtype=dtype)
+    arr = np.asarray(values, dtype=dtype)
+    if arr.shape != (n,):
+        raise ValueError(f"expected {n} values, got shape {arr.shape}")
+    return arr
+
+
+def _keys(values: np.ndarray, default: str):
+    """Unique lowercased keys + inverse index; None/"" become `default`."""
+    filled = np.where(np.equal(values, None) | np.equal(values, ""), default, values).astype(str)
+    uniq, inverse = np.unique(filled, return_inverse=True)
+    return [u.lower() for u in uniq], inverse
+
+
+def estimate_batch(types, modes=None, distances_km=None, kwhs=None, food_categories=None) -> BatchEstimate:
+    """
+    Price many activities at once from columnar inputs (equal-length
+    sequences). Factor lookups run once per distinct mode/category and the
+    arithmetic is vectorised. Fallbacks match the scalar estimators:
+    missing mode -> car, missing/unknown food category -> veg, Climatiq
+    factors when CLIMATIQ_API_KEY is set. Unsupported modes, missing
+    quantities and unknown types are reported per row instead of raising.
+    """
+    types = np.asarray(types, dtype=object)
+    n = types.shape[0]
+    modes = _column(modes, n)
+    distances = _column(distances_km, n, float)
+    kwh = _column(kwhs, n, float)
+    categories = _column(food_categories, n)
+
+    co2 = np.full(n, np.nan)
+    errors = np.full(n, None, dtype=object)
+
+    is_travel = types == "travel"
+    is_electricity = types == "electricity"
+    is_food = types == "food"
+
+    # -------- travel --------
+    if is_travel.any():
+        idx = np.flatnonzero(is_travel)
+        mode_keys, inverse = _keys(modes[idx], "car")
+        if CLIMATIQ_KEY:
+            factor = climatiq.get_factor(CLIMATIQ_TRAVEL_ACTIVITY, "distance")
+            fallback = LOCAL_TRAVEL_FACTORS["car"]
+            per_mode = np.array([
+                factor if factor is not None else LOCAL_TRAVEL_FACTORS.get(m, fallback)
+                for m in mode_keys
+            ])
+        else:
+            per_mode = np.array([LOCAL_TRAVEL_FACTORS.get(m, np.nan) for m in mode_keys])
+            unsupported = np.isnan(per_mode)
+            for j in np.flatnonzero(unsupported):
+                errors[idx[inverse == j]] = f"Unsupported travel mode: {mode_keys[j]}"
+        co2[idx] = distances[idx] * per_mode[inverse]
+
+        missing = idx[np.isnan(distances[idx])]
+        errors[missing] = "travel requires mode and distance_km"
+
+    # -------- electricity --------
+    if is_electricity.any():
+        idx = np.flatnonzero(is_electricity)
+        factor = LOCAL_ELECTRICITY_FACTOR
+        if CLIMATIQ_KEY:
+            remote = climatiq.get_factor(CLIMATIQ_ELECTRICITY_ACTIVITY, "energy")
+            if remote is not None:
+                factor = remote
+        co2[idx] = kwh[idx] * factor
+
+        missing = idx[np.isnan(kwh[idx])]
+        errors[missing] = "electricity requires kwh"
+
+    # -------- food --------
+    if is_food.any():
+        idx = np.flatnonzero(is_food)
+        cat_keys, inverse = _keys(categories[idx], "veg")
+        per_cat = np.array([LOCAL_FOOD.get(c, LOCAL_FOOD["veg"]) for c in cat_keys])
+        co2[idx] = per_cat[inverse]
+
+    # -------- unknown type --------
+    unknown = ~(is_travel | is_electricity | is_food)
+    errors[unknown] = "Invalid activity type"
+
+    co2[np.not_equal(errors, None)] = np.nan
+    return BatchEstimate(co2, errors)
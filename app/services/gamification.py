@@ -1,62 +1,81 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 from sqlalchemy.orm import Session
-from app.db.models import UserStats, Activity
+from sqlalchemy import case, func, select
+from app.db.models import UserDailyRollup, UserStats
+from app.db.crud import _upsert_insert
+
+# (max daily kg CO2, points), checked in order; above the last tier -> 0
+POINT_TIERS = [(5, 10), (10, 5)]
 
 def calculate_points(daily_co2: float) -> int:
-    if daily_co2 <= 5:
-        return 10
-    elif daily_co2 <= 10:
-        return 5
+    for limit, points in POINT_TIERS:
+        if daily_co2 <= limit:
+            return points
     return 0
 
-def update_user_stats(db: Session, user_id: str):
-    today = datetime.utcnow().date()
-
-    # Calculate today's total CO2
-    activities = (
-        db.query(Activity)
-        .filter(
-            Activity.user_id == user_id,
-            Activity.created_at >= datetime.combine(today, datetime.min.time())
-        )
-        .all()
-    )
+def _points_sql(daily_co2):
+    """calculate_points as a SQL CASE."""
+    return case(*[(daily_co2 <= limit, points) for limit, points in POINT_TIERS], else_=0)
 
-    daily_co2 = sum(float(a.co2_kg) for a in activities)
-    points = calculate_points(daily_co2)
+def _midnight(d: date) -> datetime:
+    return datetime.combine(d, datetime.min.time())
 
-    # Get yesterday's stats (for streak)
-    yesterday = today - timedelta(days=1)
-    prev = (
-        db.query(UserStats)
-        .filter(UserStats.user_id == user_id)
-        .order_by(UserStats.date.desc())
-        .first()
-    )
+def _stats_upsert_stmt(db: Session, user_id: str, day: date):
+    """
+    INSERT or overwrite the user's row for `day` with the day's total from
+    user_daily_rollup, recomputing points and the streak (yesterday's
+    streak + 1 if today's total <= yesterday's, else 1) in the same
+    statement. Derived from the rollup rather than adding a delta, so a
+    redelivered message can't count the same activity twice.
+    """
+    table = UserStats.__table__
+    prev = table.alias("prev")
+    prev_filter = (prev.c.user_id == user_id, prev.c.date == _midnight(day - timedelta(days=1)))
+    prev_co2 = select(prev.c.daily_co2_kg).where(*prev_filter).scalar_subquery()
+    prev_streak = select(prev.c.streak).where(*prev_filter).scalar_subquery()
 
-    streak = 1
-    if prev and prev.date.date() == yesterday:
-        if daily_co2 <= prev.daily_co2_kg:
-            streak = prev.streak + 1
+    def streak_for(total):
+        # no row yesterday -> NULL comparison -> 1
+        return case((total <= prev_co2, prev_streak + 1), else_=1)
 
-    # Upsert today's stats
-    existing = (
-        db.query(UserStats)
-        .filter(UserStats.user_id == user_id, UserStats.date == today)
-        .first()
+    day_total = (
+        select(func.coalesce(func.sum(UserDailyRollup.co2_kg), 0.0))
+        .where(UserDailyRollup.user_id == user_id, UserDailyRollup.day == day)
+        .scalar_subquery()
     )
+    now = datetime.utcnow()
+    stmt = _upsert_insert(db, table).values(
+        user_id=user_id,
+        date=_midnight(day),
+        daily_co2_kg=day_total,
+        points=_points_sql(day_total),
+        streak=streak_for(day_total),
+        updated_at=now,
+    )
+    total = stmt.excluded.daily_co2_kg
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "date"],
+        set_={
+            "daily_co2_kg": total,
+            "points": _points_sql(total),
+            "streak": streak_for(total),
+            "updated_at": now,
+        },
+    ).returning(table.c.daily_co2_kg, table.c.points, table.c.streak)
+
+def update_user_stats(db: Session, user_id: str, day: Optional[date] = None, commit: bool = True) -> dict:
+    """
+    Bring the user's stats row for `day` (default: today, UTC) in line with
+    the daily rollup with one atomic upsert. Idempotent. Returns the row's
+    daily_co2_kg/points/streak. Rows for earlier days aren't revisited when
+    a late activity changes them - `python -m app.services.stats_recompute`
+    repairs that.
+    """
+    day = day or datetime.utcnow().date()
+    row = db.execute(_stats_upsert_stmt(db, user_id, day)).one()
+
+    if commit:
+        db.commit()
 
-    if existing:
-        existing.daily_co2_kg = daily_co2
-        existing.points = points
-        existing.streak = streak
-    else:
-        db.add(UserStats(
-            user_id=user_id,
-            date=datetime.combine(today, datetime.min.time()),
-            daily_co2_kg=daily_co2,
-            points=points,
-            streak=streak
-        ))
-
-    db.commit()
+    return {"daily_co2_kg": float(row.daily_co2_kg), "points": row.points, "streak": row.streak}
@@ -0,0 +1,249 @@
+# backend/app/services/gemini.py
+"""
+Process-wide Gemini access.
+
+- one shared genai.Client (HTTP connections / TLS sessions are reused)
+- token-bucket limiter for requests-per-minute and tokens-per-minute
+- bounded number of in-flight calls, shared by threads and event loops
+- a call that can't get a slot within GEMINI_SLOT_DEADLINE seconds returns ""
+  as soon as that is known (no sleeping past the deadline), so the caller
+  falls through to rule-based suggestions
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+MAX_OUTPUT_TOKENS = 150
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "250000"))
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "4"))
+GEMINI_SLOT_DEADLINE = float(os.getenv("GEMINI_SLOT_DEADLINE", "0.5"))
+
+# -------------------------------------------------
+# RATE LIMITING
+# -------------------------------------------------
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        if self.level >= amount:
+            return 0.0
+        if amount > self.capacity:
+            return float("inf")
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets, taken together."""
+
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float) -> float:
+        """Take one request + `tokens` and return 0, or return the wait needed."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait == 0.0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            return wait
+
+    def acquire(self, tokens: float, deadline: float) -> bool:
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            # don't sleep for a slot that won't free up in time
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float, deadline: float) -> bool:
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+limiter = RateLimiter()
+
+# -------------------------------------------------
+# IN-FLIGHT LIMIT
+# -------------------------------------------------
+
+class InFlightLimit:
+    """
+    One cap for threads and event loops together. A released slot is handed
+    straight to the oldest waiter: a threading.Event for threads, a future
+    resolved on its own loop for coroutines (which never block a thread).
+    """
+
+    def __init__(self, limit: int):
+        self._free = limit
+        self._waiters = deque()   # threading.Event or (loop, asyncio.Future)
+        self._lock = threading.Lock()
+
+    def _take(self, waiter) -> bool:
+        with self._lock:
+            if self._free:
+                self._free -= 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _forget(self, waiter) -> bool:
+        """Stop waiting. False if a slot was already handed to `waiter`."""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def acquire(self, timeout: float) -> bool:
+        waiter = threading.Event()
+        if self._take(waiter) or waiter.wait(timeout):
+            return True
+        return not self._forget(waiter)
+
+    async def acquire_async(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        if self._take((loop, fut)):
+            return True
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except BaseException as e:
+            if not self._forget((loop, fut)) and fut.done() and not fut.cancelled():
+                # handed a slot just as we gave up: pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+
+    def _hand_over(self, fut):
+        if fut.done():
+            self.release()   # the waiter timed out or was cancelled meanwhile
+        else:
+            fut.set_result(True)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, fut = waiter
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(self._hand_over, fut)
+                    return
+            self._free += 1
+
+
+_in_flight = InFlightLimit(GEMINI_MAX_IN_FLIGHT)
+
+# -------------------------------------------------
+# CLIENT
+# -------------------------------------------------
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _client
+
+def estimate_tokens(prompt: str) -> int:
+    # ~4 chars per token, plus the response budget
+    return len(prompt) // 4 + MAX_OUTPUT_TOKENS
+
+def _config() -> dict:
+    return {
+        "temperature": 0.0,
+        "max_output_tokens": MAX_OUTPUT_TOKENS
+    }
+
+# -------------------------------------------------
+# CALLS
+# -------------------------------------------------
+
+def generate(prompt: str) -> str:
+    deadline = time.monotonic() + GEMINI_SLOT_DEADLINE
+    if not _in_flight.acquire(timeout=GEMINI_SLOT_DEADLINE):
+        print("Gemini busy, using fallback")
+        return ""
+    try:
+        if not limiter.acquire(estimate_tokens(prompt), deadline):
+            print("Gemini rate limit reached, using fallback")
+            return ""
+        response = get_client().models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=_config()
+        )
+        return response.text if hasattr(response, "text") and response.text else ""
+    except Exception as e:
+        print("Gemini failed:", e)
+        return ""
+    finally:
+        _in_flight.release()
+
+async def generate_async(prompt: str) -> str:
+    deadline = time.monotonic() + GEMINI_SLOT_DEADLINE
+    if not await _in_flight.acquire_async(GEMINI_SLOT_DEADLINE):
+        print("Gemini busy, using fallback")
+        return ""
+    try:
+        if not await limiter.acquire_async(estimate_tokens(prompt), deadline):
+            print("Gemini rate limit reached, using fallback")
+            return ""
+        response = await get_client().aio.models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=_config()
+        )
+        return response.text if hasattr(response, "text") and response.text else ""
+    except Exception as e:
+        print("Gemini failed:", e)
+        return ""
+    finally:
+        _in_flight.release()
@@ -0,0 +1,216 @@
+# backend/app/services/leaderboard.py
+"""
+In-memory points leaderboards (daily, weekly = last 7 days, all-time).
+
+Each board is a SortedList of (-points, user_id) plus a user -> points map,
+so a score change, a rank lookup and a top-K slice are all O(log n).
+
+Boards are built from user_stats on startup and when the UTC day rolls over.
+In between, the web process's refresh task pulls the users whose user_stats
+rows were written since its watermark (updated_at, stamped by
+update_user_stats and stats_recompute), re-sums just those users' three
+totals and sets them - a cheap indexed read every LEADERBOARD_POLL_MS,
+however many writes the consumer makes. The watermark is re-read with a
+small overlap, so rows committed slightly out of order aren't missed;
+setting a total twice is harmless.
+"""
+import os
+import asyncio
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import case, func, select
+
+from app.db.models import UserStats
+
+LEADERBOARD_POLL_SECONDS = float(os.getenv("LEADERBOARD_POLL_MS", "2000")) / 1000
+# more changed users than this in one poll: cheaper to rebuild
+LEADERBOARD_MAX_CHANGED = int(os.getenv("LEADERBOARD_MAX_CHANGED", "5000"))
+WATERMARK_OVERLAP = timedelta(seconds=5)
+EPOCH = datetime(1970, 1, 1)
+BOARDS = ("daily", "weekly", "alltime")
+
+
+class RankIndex:
+    def __init__(self, scores: Dict[str, int] = None):
+        self._scores = dict(scores or {})
+        self._order = SortedList((-s, u) for u, s in self._scores.items())
+
+    def __len__(self):
+        return len(self._scores)
+
+    def score(self, user_id: str) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def set(self, user_id: str, score: int):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._order.remove((-old, user_id))
+        self._scores[user_id] = score
+        self._order.add((-score, user_id))
+
+    def add(self, user_id: str, delta: int):
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based; tied users share a rank."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._order.bisect_left((-score, "")) + 1
+
+    def top(self, k: int) -> List[Tuple[int, str, int]]:
+        """(rank, user_id, points) for the first k users."""
+        entries = []
+        for neg, user_id in self._order.islice(0, k):
+            if entries and entries[-1][2] == -neg:
+                rank = entries[-1][0]
+            else:
+                rank = len(entries) + 1
+            entries.append((rank, user_id, -neg))
+        return entries
+
+
+def _midnight(d: date) -> datetime:
+    return datetime.combine(d, datetime.min.time())
+
+def board_statements(today: date):
+    """One GROUP BY per board: user_id -> summed points."""
+    def totals(since: Optional[date]):
+        stmt = select(UserStats.user_id, func.sum(UserStats.points)).group_by(UserStats.user_id)
+        if since is not None:
+            stmt = stmt.where(UserStats.date >= _midnight(since))
+        return stmt
+
+    return {
+        "daily": totals(today),
+        "weekly": totals(today - timedelta(days=6)),
+        "alltime": totals(None),
+    }
+
+def changes_statements(today: date, since: datetime):
+    """
+    Users with rows written after `since` (and the newest stamp seen), and
+    their three board totals in one pass over their rows.
+    """
+    changed = (
+        select(UserStats.user_id, func.max(UserStats.updated_at))
+        .where(UserStats.updated_at > since)
+        .group_by(UserStats.user_id)
+        .limit(LEADERBOARD_MAX_CHANGED + 1)
+    )
+
+    def totals(user_ids: List[str]):
+        def since_day(d: date):
+            return func.sum(case((UserStats.date >= _midnight(d), UserStats.points), else_=0))
+
+        return (
+            select(
+                UserStats.user_id,
+                since_day(today),
+                since_day(today - timedelta(days=6)),
+                func.sum(UserStats.points),
+            )
+            .where(UserStats.user_id.in_(user_ids))
+            .group_by(UserStats.user_id)
+        )
+
+    return changed, totals
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.boards = {name: RankIndex() for name in BOARDS}
+        self.day: Optional[date] = None   # None until the first rebuild
+        self.watermark: Optional[datetime] = None   # newest updated_at applied
+
+    def needs_rebuild(self) -> bool:
+        return self.day != datetime.utcnow().date()
+
+    def load(self, day: date, totals: Dict[str, List[Tuple[str, int]]], watermark: datetime):
+        boards = {
+            name: RankIndex({u: int(p or 0) for u, p in totals.get(name, [])})
+            for name in BOARDS
+        }
+        with self._lock:
+            self.boards = boards
+            self.day = day
+            self.watermark = watermark
+
+    def apply(self, rows: List[Tuple[str, int, int, int]], watermark: datetime):
+        """Set (user_id, daily, weekly, alltime) totals pulled from the DB."""
+        with self._lock:
+            for user_id, daily, weekly, alltime in rows:
+                for name, points in (("daily", daily), ("weekly", weekly), ("alltime", alltime)):
+                    self.boards[name].set(user_id, int(points or 0))
+            self.watermark = max(self.watermark, watermark)
+
+    def top(self, board: str, k: int):
+        with self._lock:
+            return self.boards[board].top(k), len(self.boards[board])
+
+    def rank(self, board: str, user_id: str):
+        with self._lock:
+            index = self.boards[board]
+            return index.rank(user_id), index.score(user_id), len(index)
+
+
+leaderboard = Leaderboard()
+
+# --------------------------------------------------
+# Rebuild / incremental refresh
+# --------------------------------------------------
+
+async def rebuild_async(db) -> Leaderboard:
+    today = datetime.utcnow().date()
+    # read before the totals, so writes during the rebuild are pulled next time;
+    # taken from the rows, so it is on the writers' clock
+    watermark = await db.scalar(select(func.max(UserStats.updated_at))) or EPOCH
+    totals = {}
+    for name, stmt in board_statements(today).items():
+        totals[name] = (await db.execute(stmt)).all()
+    leaderboard.load(today, totals, watermark)
+    return leaderboard
+
+async def refresh_async(db) -> int:
+    """Pull users changed since the watermark. Returns how many were updated."""
+    today = leaderboard.day
+    changed_stmt, totals_stmt = changes_statements(today, leaderboard.watermark - WATERMARK_OVERLAP)
+    changed = (await db.execute(changed_stmt)).all()
+    if not changed:
+        return 0
+    if len(changed) > LEADERBOARD_MAX_CHANGED:
+        await rebuild_async(db)
+        return len(changed)
+    rows = (await db.execute(totals_stmt([u for u, _ in changed]))).all()
+    leaderboard.apply(rows, max(stamp for _, stamp in changed))
+    return len(rows)
+
+_rebuild_lock = asyncio.Lock()
+
+async def ensure_fresh(session_factory):
+    """Build on first use and after the UTC day rolls over; concurrent callers share one rebuild."""
+    if not leaderboard.needs_rebuild():
+        return
+    async with _rebuild_lock:
+        if not leaderboard.needs_rebuild():
+            return
+        async with session_factory() as db:
+            await rebuild_async(db)
+
+async def refresh_forever(session_factory, poll_seconds: float = LEADERBOARD_POLL_SECONDS):
+    """Web-process task: keep the boards current. Runs until cancelled."""
+    while True:
+        try:
+            await ensure_fresh(session_factory)
+            async with _rebuild_lock:
+                async with session_factory() as db:
+                    await refresh_async(db)
+        except Exception as e:
+            print("Leaderboard refresh failed:", e)
+        await asyncio.sleep(poll_seconds)
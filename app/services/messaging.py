@@ -46,13 +46,32 @@
 
 import os
 import json
+import time
+import queue
+import threading
+from typing import NamedTuple
 import pika
+from pika.exceptions import AMQPError
+from app.services.metrics import PUBLISH_SECONDS, PUBLISHED, PUBLISH_FAILURES
 
 RABBITMQ_URL = (
     os.getenv("RABBITMQ_PRIVATE_URL")
     or os.getenv("RABBITMQ_URL")  # fallback for local dev
 )
 
+QUEUE_NAME = os.getenv("RABBIT_QUEUE", "activities")
+PUBLISH_POOL_SIZE = int(os.getenv("RABBIT_PUBLISH_POOL_SIZE", "4"))
+PUBLISH_CHECKOUT_TIMEOUT = float(os.getenv("RABBIT_PUBLISH_CHECKOUT_TIMEOUT", "5"))
+PUBLISH_RETRIES = int(os.getenv("RABBIT_PUBLISH_RETRIES", "1"))
+PUBLISH_CONFIRM_TIMEOUT = float(os.getenv("RABBIT_PUBLISH_CONFIRM_TIMEOUT", "10"))
+
+PERSISTENT = pika.BasicProperties(delivery_mode=2)
+
+
+class PublishResult(NamedTuple):
+    sent: int        # leading messages confirmed by the broker
+    rejected: bool   # message `sent` itself was nacked / never confirmed (not an outage)
+
 def _get_connection_params():
     
     if not RABBITMQ_URL:
@@ -60,20 +79,266 @@ def _get_connection_params():
 
     return pika.URLParameters(RABBITMQ_URL)
 
+# --------------------------------------------------
+# Pooled publisher
+# --------------------------------------------------
+
+class _ChannelSlot:
+    """
+    One connection + confirm-mode channel. pika's BlockingConnection is not
+    thread-safe, so a slot is only ever used by one thread at a time.
+
+    BlockingChannel.confirm_delivery() makes every basic_publish wait for its
+    own ack, one round trip per message. Confirms are turned on on the
+    underlying channel instead: a batch is written back to back and the acks
+    (by delivery tag, possibly `multiple`) are collected in one wait.
+    """
+
+    def __init__(self, params):
+        self.connection = pika.BlockingConnection(params)
+        self.channel = self.connection.channel()
+        self._next_tag = 1
+        self._unconfirmed = set()
+        self._nacked = set()
+        self._batch = []
+        selected = []
+        # PRIVATE pika API: BlockingChannel._impl is the underlying
+        # pika.channel.Channel. BlockingChannel has no public way to enable
+        # confirms without the per-message wait, so requirements.txt bounds
+        # pika to the releases this is tested against (tests/test_messaging.py
+        # checks the attribute and signature); recheck before raising it.
+        impl = getattr(self.channel, "_impl", None)
+        if impl is None:
+            raise RuntimeError(f"pika {pika.__version__}: BlockingChannel._impl missing, batch confirms unavailable")
+        impl.confirm_delivery(ack_nack_callback=self._on_confirm, callback=selected.append)
+        while not selected:
+            self.connection.process_data_events(time_limit=None)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            done = {t for t in self._unconfirmed if method.delivery_tag == 0 or t <= method.delivery_tag}
+        else:
+            done = {method.delivery_tag}
+        self._unconfirmed -= done
+        if isinstance(method, pika.spec.Basic.Nack):
+            self._nacked |= done
+
+    @property
+    def confirmed(self) -> int:
+        """How many leading messages of the last batch the broker has acked."""
+        count = 0
+        for tag in self._batch:
+            if tag in self._unconfirmed or tag in self._nacked:
+                break
+            count += 1
+        return count
+
+    def publish(self, routing_key: str, bodies: list, timeout: float = PUBLISH_CONFIRM_TIMEOUT) -> int:
+        """Publish bodies in order, then wait once for their confirms. Returns `confirmed`."""
+        self._batch = []
+        self._nacked.clear()
+        for body in bodies:
+            tag = self._next_tag
+            self._next_tag += 1
+            self._batch.append(tag)
+            self._unconfirmed.add(tag)
+            self.channel.basic_publish(exchange="", routing_key=routing_key, body=body, properties=PERSISTENT)
+
+        deadline = time.monotonic() + timeout
+        while self._unconfirmed and self.channel.is_open:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.connection.process_data_events(time_limit=remaining)
+        return self.confirmed
+
+    @property
+    def rejected(self) -> bool:
+        """The first unconfirmed message of the last batch was nacked or timed out on a live channel."""
+        return self.confirmed < len(self._batch) and self.channel.is_open
+
+    def is_usable(self) -> bool:
+        if not (self.connection.is_open and self.channel.is_open):
+            return False
+        try:
+            # services heartbeats missed while the slot sat idle in the pool
+            self.connection.process_data_events(time_limit=0)
+        except Exception:
+            return False
+        return self.connection.is_open and self.channel.is_open
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+class ActivityPublisher:
+    """
+    Long-lived publisher holding a small pool of confirm-mode channels.
+    The queue is declared once, dead channels are replaced on checkout,
+    and a publish that hits a broken connection is retried on a fresh one.
+    """
+
+    def __init__(self, queue_name: str = QUEUE_NAME, pool_size: int = PUBLISH_POOL_SIZE,
+                 checkout_timeout: float = PUBLISH_CHECKOUT_TIMEOUT,
+                 retries: int = PUBLISH_RETRIES, params_factory=_get_connection_params,
+                 slot_factory=_ChannelSlot):
+        self.queue_name = queue_name
+        self.pool_size = max(1, pool_size)
+        self.checkout_timeout = checkout_timeout
+        self.retries = retries
+        self._params_factory = params_factory
+        self._slot_factory = slot_factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._declared = False
+        self._closed = False
+
+    def _new_slot(self):
+        slot = self._slot_factory(self._params_factory())
+        if not self._declared:
+            slot.channel.queue_declare(queue=self.queue_name, durable=True)
+            self._declared = True
+        return slot
+
+    def _checkout(self):
+        try:
+            slot = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._new_slot()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            slot = self._idle.get(timeout=self.checkout_timeout)
+
+        if not slot.is_usable():
+            slot.close()
+            try:
+                slot = self._new_slot()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return slot
+
+    def _checkin(self, slot):
+        if self._closed:
+            slot.close()
+            return
+        self._idle.put(slot)
+
+    def _discard(self, slot):
+        slot.close()
+        with self._lock:
+            self._created -= 1
+
+    def publish_many(self, payloads: list) -> PublishResult:
+        """
+        Publish payloads in order on one pooled channel and wait for the
+        broker's confirms once per batch. Returns how many leading payloads
+        were confirmed before giving up, and whether the next one was
+        rejected by the broker (as opposed to the broker being unreachable).
+        """
+        started = time.perf_counter()
+        result = self._publish_many(payloads)
+        PUBLISH_SECONDS.observe(time.perf_counter() - started)
+        PUBLISHED.inc(result.sent)
+        return result
+
+    def _publish_many(self, payloads: list) -> PublishResult:
+        bodies = [json.dumps(payload) for payload in payloads]
+        published = 0
+        failures = 0
+        while published < len(payloads):
+            try:
+                slot = self._checkout()
+            except Exception as e:
+                PUBLISH_FAILURES.inc(1, "checkout")
+                print("RabbitMQ channel checkout failed:", e)
+                return PublishResult(published, False)
+            try:
+                confirmed = slot.publish(self.queue_name, bodies[published:])
+                error = None if published + confirmed == len(bodies) else "nacked or unconfirmed"
+            except AMQPError as e:
+                confirmed = slot.confirmed
+                error = e
+            except Exception as e:
+                PUBLISH_FAILURES.inc(1, "error")
+                self._discard(slot)
+                print("RabbitMQ publish failed:", e)
+                return PublishResult(published + slot.confirmed, False)
+            published += confirmed
+            rejected = slot.rejected
+            if error is None:
+                self._checkin(slot)
+                continue
+            # broken connection, nack or confirm timeout: reconnect and resume
+            # after the last confirmed message
+            PUBLISH_FAILURES.inc(1, "amqp")
+            self._discard(slot)
+            failures += 1
+            if failures > self.retries:
+                print("RabbitMQ publish failed:", error)
+                return PublishResult(published, rejected)
+        return PublishResult(published, False)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(slot)
+
+
+_publisher = None
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+def get_publisher() -> ActivityPublisher:
+    """One publisher per worker process (re-created after a fork)."""
+    global _publisher, _publisher_pid
+    pid = os.getpid()
+    if _publisher is None or _publisher_pid != pid:
+        with _publisher_lock:
+            if _publisher is None or _publisher_pid != pid:
+                _publisher = ActivityPublisher()
+                _publisher_pid = pid
+    return _publisher
+
+def close_publisher():
+    global _publisher
+    with _publisher_lock:
+        if _publisher is not None and _publisher_pid == os.getpid():
+            _publisher.close()
+        _publisher = None
+
+# --------------------------------------------------
+# Public API
+# --------------------------------------------------
+
 def publish_activity(payload: dict) -> bool:
-    try:
-        params = _get_connection_params()
-        conn = pika.BlockingConnection(params)
-        channel = conn.channel()
-        channel.queue_declare(queue="activities", durable=True)
-        channel.basic_publish(
-            exchange="",
-            routing_key="activities",
-            body=json.dumps(payload),
-            properties=pika.BasicProperties(delivery_mode=2),
-        )
-        conn.close()
-        return True
-    except Exception as e:
-        print("RabbitMQ publish failed:", e)
-        return False
+    return get_publisher().publish_many([payload]).sent == 1
+
+def publish_activities(payloads: list) -> PublishResult:
+    """
+    Publish many activity messages on one pooled channel.
+    Returns how many were confirmed by the broker and whether the next one
+    was rejected (see ActivityPublisher.publish_many).
+    """
+    if not payloads:
+        return PublishResult(0, False)
+    return get_publisher().publish_many(payloads)
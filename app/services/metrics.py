@@ -0,0 +1,320 @@
+# backend/app/services/metrics.py
+"""
+In-process metrics, exposed on GET /metrics in the Prometheus text format.
+
+    http_*      per-route latency, status and in-flight requests (middleware)
+    db_*        query count and time per engine and per request, pool
+                checkout wait and saturation (SQLAlchemy events)
+    rabbit_*    publish latency, confirmed messages and failures
+
+Values live in this process only: run one worker per scrape target (the
+Procfile does) or scrape each worker. Route labels use the path template
+(`/summary/users/{user_id}`), never the raw path, to keep label sets small.
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional, Tuple
+
+from sqlalchemy import event, exc as sa_exc
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# --------------------------------------------------
+# Registry
+# --------------------------------------------------
+
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, *labels):
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class GaugeFunc(_Metric):
+    """Gauge read at scrape time: fn() yields (label values, value) pairs."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], fn: Callable):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def _samples(self):
+        for labels, value in self.fn():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(labels, (list(s[0]), s[1], s[2])) for labels, s in self._values.items()]
+        bounds = self.buckets + (float("inf"),)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+# --------------------------------------------------
+# Metrics
+# --------------------------------------------------
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.",
+                        ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency.",
+                          ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served.", ("method",))
+HTTP_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements run per HTTP request.",
+                            ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+HTTP_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL statements per HTTP request.",
+                            ("method", "route"))
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed.", ("engine", "operation"))
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement latency.", ("engine",))
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised.", ("engine",))
+POOL_CHECKOUT_SECONDS = Histogram("db_pool_checkout_wait_seconds",
+                                  "Time to get a connection from the pool (includes connecting).",
+                                  ("engine",))
+POOL_TIMEOUTS = Counter("db_pool_checkout_timeouts_total", "Pool checkouts that timed out.", ("engine",))
+
+PUBLISH_SECONDS = Histogram("rabbit_publish_duration_seconds",
+                            "Time to publish and confirm one batch of messages.")
+PUBLISHED = Counter("rabbit_published_messages_total", "Messages confirmed by the broker.")
+PUBLISH_FAILURES = Counter("rabbit_publish_failures_total", "Failed publish attempts by reason.",
+                           ("reason",))
+
+# --------------------------------------------------
+# Per-request DB usage
+# --------------------------------------------------
+
+class DbUsage:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+# set by the middleware; threadpool and greenlet hops copy the context,
+# so they all add to the same object
+_db_usage: ContextVar[Optional[DbUsage]] = ContextVar("db_usage", default=None)
+
+# --------------------------------------------------
+# SQLAlchemy instrumentation
+# --------------------------------------------------
+
+_engines = {}    # name -> engine, for the pool gauges
+_timed_pool_classes = {}
+
+def _timed_pool_class(cls, engine_name: str):
+    key = (cls, engine_name)
+    if key not in _timed_pool_classes:
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return cls._do_get(self)
+            except sa_exc.TimeoutError:
+                POOL_TIMEOUTS.inc(1, engine_name)
+                raise
+            finally:
+                POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started, engine_name)
+
+        _timed_pool_classes[key] = type(f"Timed{cls.__name__}", (cls,), {"_do_get": _do_get})
+    return _timed_pool_classes[key]
+
+def instrument_engine(engine, name: str):
+    """Count and time statements on a (sync) Engine; time its pool checkouts."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("metrics_started", time.perf_counter())
+        DB_QUERIES.inc(1, name, statement.lstrip().split(None, 1)[0].upper() if statement else "")
+        DB_QUERY_SECONDS.observe(elapsed, name)
+        usage = _db_usage.get()
+        if usage is not None:
+            usage.queries += 1
+            usage.seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        DB_QUERY_ERRORS.inc(1, name)
+        if context.connection is not None:
+            context.connection.info.pop("metrics_started", None)
+
+    # pools have no "before checkout" event, so time _do_get in a subclass;
+    # recreate() (engine.dispose) builds from __class__ and keeps it
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        pool.__class__ = _timed_pool_class(type(pool), name)
+        _engines[name] = engine
+
+def _pool_stats():
+    for name, engine in _engines.items():
+        pool = engine.pool
+        checked_out = pool.checkedout()
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        yield (name, "checked_out"), checked_out
+        yield (name, "idle"), pool.checkedin()
+        yield (name, "overflow"), max(pool.overflow(), 0)
+        yield (name, "size"), pool.size()
+        if pool._max_overflow >= 0:
+            # unbounded overflow (-1) can't saturate
+            yield (name, "saturation"), checked_out / capacity if capacity else 0.0
+
+POOL_STATE = GaugeFunc("db_pool_connections",
+                       "Pool state: checked_out, idle, overflow, size, and saturation (checked out / max).",
+                       ("engine", "state"), _pool_stats)
+
+# --------------------------------------------------
+# ASGI middleware
+# --------------------------------------------------
+
+def _route_template(scope) -> str:
+    """
+    Path template of the matched route, with its router's prefix. FastAPI
+    versions that keep included routers lazy store route.path without the
+    prefix, so the prefix is taken from the request path: the part in front
+    of the shortest suffix the route's own pattern matches.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    root_path = scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    pattern = getattr(route, "path_regex", None)
+    if pattern is None:
+        return template
+    start = 0
+    while start != -1:
+        if pattern.match(path[start:]):
+            return path[:start] + template
+        start = path.find("/", start + 1)
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI (no BaseHTTPMiddleware task hop). The route is known only after
+    the router has dispatched, so labels are resolved on the way out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        usage = DbUsage()
+        token = _db_usage.set(usage)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(1, method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec(1, method)
+            _db_usage.reset(token)
+            route = _route_template(scope)
+            HTTP_REQUESTS.inc(1, method, route, str(status))
+            HTTP_DURATION.observe(elapsed, method, route)
+            HTTP_DB_QUERIES.observe(usage.queries, method, route)
+            HTTP_DB_SECONDS.observe(usage.seconds, method, route)
@@ -0,0 +1,176 @@
+# backend/app/services/outbox.py
+"""
+Relay for the activity outbox.
+
+Requests write their queue messages to activity_outbox in the activity's
+transaction; the relay publishes unsent rows in id order, in batches, on a
+confirm-mode channel, and marks the confirmed ones sent. A crash between
+publish and mark re-sends the batch, so delivery is at-least-once.
+
+Publishing stops at the first row that fails. If the broker rejected that
+row (nack, or no confirm on a live channel) its attempts count goes up, and
+after OUTBOX_MAX_ATTEMPTS it is parked (failed_at) and the relay moves past
+it; `python relay.py --requeue-failed` un-parks rows. If the broker could
+not be reached at all, no row is charged: the relay backs off and retries.
+
+The relay runs in-process as a web-app task (OUTBOX_RELAY_IN_PROCESS) and/or
+as its own process (`python relay.py`). Only Postgres can run several relays
+at once - batches are claimed with FOR UPDATE SKIP LOCKED, and the locks are
+held for the batch's publish - so the in-process relay defaults to on only
+there. Elsewhere (SQLite) run exactly one relay: relay.py, or a single web
+worker with OUTBOX_RELAY_IN_PROCESS=true.
+"""
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select, update
+
+from app.db.session import SessionLocal, engine
+from app.db.models import OutboxEvent
+from app.services.messaging import publish_activities
+
+RELAY_BATCH_SIZE = int(os.getenv("OUTBOX_RELAY_BATCH_SIZE", "100"))
+RELAY_POLL_SECONDS = float(os.getenv("OUTBOX_RELAY_POLL_MS", "1000")) / 1000
+_MULTI_RELAY_SAFE = engine.dialect.name == "postgresql"
+RELAY_IN_PROCESS = os.getenv("OUTBOX_RELAY_IN_PROCESS", "true" if _MULTI_RELAY_SAFE else "false") == "true"
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# broker trouble: the wait doubles from the poll interval up to this
+MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_RELAY_MAX_BACKOFF_MS", "30000")) / 1000
+SENT_RETENTION = timedelta(hours=float(os.getenv("OUTBOX_SENT_RETENTION_HOURS", "24")))
+PURGE_EVERY_SECONDS = 600
+
+# --------------------------------------------------
+# Relay
+# --------------------------------------------------
+
+def relay_batch(batch_size: int = RELAY_BATCH_SIZE):
+    """Publish up to batch_size pending events. Returns (claimed, confirmed)."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(OutboxEvent.id, OutboxEvent.payload, OutboxEvent.attempts)
+            .where(OutboxEvent.sent_at.is_(None), OutboxEvent.failed_at.is_(None))
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            db.rollback()
+            return 0, 0
+
+        # confirms come back in order, so the first `sent` rows are delivered
+        result = publish_activities([r.payload for r in rows])
+        sent = result.sent
+        ids = [r.id for r in rows]
+        if sent:
+            db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(ids[:sent]))
+                .values(sent_at=datetime.utcnow(), attempts=OutboxEvent.attempts + 1)
+            )
+        if sent < len(ids) and result.rejected:
+            # the broker refused the first unconfirmed row: charge it an attempt
+            head = rows[sent]
+            values = {"attempts": OutboxEvent.attempts + 1}
+            if head.attempts + 1 >= MAX_ATTEMPTS:
+                values["failed_at"] = datetime.utcnow()
+                print(f"Parking outbox event {head.id} after {head.attempts + 1} failed publishes")
+            db.execute(update(OutboxEvent).where(OutboxEvent.id == head.id).values(**values))
+        db.commit()
+        return len(ids), sent
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def requeue_failed() -> int:
+    """Un-park every parked row (after fixing whatever made them fail)."""
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.failed_at.is_not(None))
+            .values(failed_at=None, attempts=0)
+        )
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+def purge_sent(retention: timedelta = SENT_RETENTION) -> int:
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            delete(OutboxEvent).where(OutboxEvent.sent_at < datetime.utcnow() - retention)
+        )
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+def run_relay(should_stop, batch_size: int = RELAY_BATCH_SIZE, poll_seconds: float = RELAY_POLL_SECONDS):
+    """
+    Blocking relay loop (relay.py). Full batches are drained back to back;
+    otherwise it waits poll_seconds, longer (doubling) while publishes fail.
+    """
+    last_purge = 0.0
+    backoff = poll_seconds
+    while not should_stop():
+        try:
+            claimed, sent = relay_batch(batch_size)
+            if sent:
+                print(f"Relayed {sent} outbox events")
+            if time.monotonic() - last_purge > PURGE_EVERY_SECONDS:
+                purge_sent()
+                last_purge = time.monotonic()
+        except Exception as e:
+            print("Outbox relay failed:", e)
+            claimed, sent = 0, 0
+        if sent < claimed:
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            continue
+        backoff = poll_seconds
+        if claimed < batch_size:
+            time.sleep(poll_seconds)
+
+# --------------------------------------------------
+# In-process relay (web app)
+# --------------------------------------------------
+
+_wakeup = asyncio.Event()
+
+def nudge():
+    """Tell the in-process relay there is something to send (call after commit)."""
+    _wakeup.set()
+
+async def relay_forever(batch_size: int = RELAY_BATCH_SIZE, poll_seconds: float = RELAY_POLL_SECONDS):
+    """Same loop as run_relay, but woken early by nudge(). Runs until cancelled."""
+    last_purge = 0.0
+    backoff = poll_seconds
+    while True:
+        _wakeup.clear()
+        try:
+            claimed, sent = await run_in_threadpool(relay_batch, batch_size)
+            if time.monotonic() - last_purge > PURGE_EVERY_SECONDS:
+                await run_in_threadpool(purge_sent)
+                last_purge = time.monotonic()
+        except Exception as e:
+            print("Outbox relay failed:", e)
+            claimed, sent = 0, 0
+
+        if sent < claimed:
+            # broker trouble: back off instead of retrying on every nudge
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            continue
+        backoff = poll_seconds
+        if claimed < batch_size:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                pass
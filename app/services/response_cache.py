@@ -0,0 +1,199 @@
+# backend/app/services/response_cache.py
+"""
+Per-user versioned response cache for the polled read endpoints.
+
+Keys are (endpoint, user_id, user version, params). Writers bump the user's
+version (create_activity, the consumer) instead of deleting keys, so every
+cached view of that user goes stale at once; old entries simply age out.
+Concurrent misses for the same key share one loader call, which gets its own
+AsyncSession - not a caller's, since any caller may disconnect mid-load.
+
+The default backend is in-process. Versions bumped in another process (the
+consumer) are only seen through a shared backend - set RESPONSE_CACHE_REDIS_URL
+(needs the `redis` package). Without one, endpoints that show consumer-written
+data (cached(..., consumer_written=True)) are not cached at all, rather than
+served stale for up to RESPONSE_CACHE_TTL. The redis client is blocking, so
+from async code its calls go through the threadpool.
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import AsyncSessionLocal
+
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL")
+
+_MISS = object()
+
+# --------------------------------------------------
+# Backends
+# --------------------------------------------------
+
+class MemoryBackend:
+    blocking = False
+    shared = False   # bumps from other processes never arrive
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISS
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return _MISS
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def version(self, user_id: str) -> int:
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: str) -> int:
+        with self._lock:
+            v = self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            return v
+
+
+class RedisBackend:
+    """Shared backend so web workers and consumers see the same versions."""
+    blocking = True
+    shared = True
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self._redis.get("rc:" + key)
+        return _MISS if raw is None else json.loads(raw)
+
+    def set(self, key: str, value, ttl: float):
+        self._redis.set("rc:" + key, json.dumps(value, default=str), px=int(ttl * 1000))
+
+    def version(self, user_id: str) -> int:
+        return int(self._redis.get("rcv:" + user_id) or 0)
+
+    def bump(self, user_id: str) -> int:
+        return int(self._redis.incr("rcv:" + user_id))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if REDIS_URL:
+                    _backend = RedisBackend(REDIS_URL)
+                else:
+                    print("RESPONSE_CACHE_REDIS_URL not set: in-process response cache, "
+                          "endpoints showing consumer-written data are not cached")
+                    _backend = MemoryBackend()
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+# --------------------------------------------------
+# API
+# --------------------------------------------------
+
+async def _call(backend, fn, *args):
+    # keep network round trips off the event loop
+    if backend.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+def bump_user(user_id: str):
+    """Invalidate every cached response for this user (sync callers: the consumer)."""
+    if not user_id:
+        return
+    try:
+        get_backend().bump(user_id)
+    except Exception as e:
+        print("Response cache bump failed:", e)
+
+async def bump_user_async(user_id: str):
+    if not user_id:
+        return
+    backend = get_backend()
+    try:
+        await _call(backend, backend.bump, user_id)
+    except Exception as e:
+        print("Response cache bump failed:", e)
+
+def _read(backend, endpoint: str, user_id: str, params: Any):
+    key = f"{endpoint}:{user_id}:{backend.version(user_id)}:{json.dumps(params, sort_keys=True, default=str)}"
+    return key, backend.get(key)
+
+async def _load(loader: Callable[[AsyncSession], Awaitable[Any]]):
+    async with AsyncSessionLocal() as db:
+        return await loader(db)
+
+_in_flight = {}   # key -> asyncio.Task (single-flight per event loop)
+
+async def cached(endpoint: str, user_id: str, params: Any,
+                 loader: Callable[[AsyncSession], Awaitable[Any]], ttl: float = CACHE_TTL,
+                 consumer_written: bool = False):
+    """
+    Return the cached value for (endpoint, user, version, params), or run
+    `loader(db)` once for all concurrent callers and cache its JSON-able
+    result. The loader is given a session owned by the shared load.
+    consumer_written: the data is also written by the consumer, whose bumps
+    only reach a shared backend; with the in-process one it isn't cached.
+    """
+    backend = get_backend()
+    if consumer_written and not backend.shared:
+        return await _load(loader)
+    try:
+        # version + get in one hop for a blocking backend
+        key, value = await _call(backend, _read, backend, endpoint, user_id, params)
+    except Exception as e:
+        print("Response cache read failed:", e)
+        return await _load(loader)
+    if value is not _MISS:
+        return value
+
+    task = _in_flight.get(key)
+    if task is None:
+        async def load():
+            try:
+                result = await _load(loader)
+                try:
+                    await _call(backend, backend.set, key, result, ttl)
+                except Exception as e:
+                    print("Response cache write failed:", e)
+                return result
+            finally:
+                _in_flight.pop(key, None)
+
+        task = _in_flight[key] = asyncio.ensure_future(load())
+
+    # shield: one cancelled caller must not cancel the shared load
+    return await asyncio.shield(task)
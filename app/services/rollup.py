@@ -0,0 +1,86 @@
+# backend/app/services/rollup.py
+"""
+Backfill / rebuild of the user_daily_rollup table from raw activities.
+
+    python -m app.services.rollup                 # rebuild everything
+    python -m app.services.rollup --user alice    # one user
+    python -m app.services.rollup --since 2024-01-01
+"""
+import argparse
+import time
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.db.models import Activity, UserDailyRollup
+
+
+def rebuild_rollups(db: Session, user_id: Optional[str] = None, since: Optional[date] = None) -> int:
+    """
+    Replace rollup rows (optionally limited to a user and/or days >= since)
+    with totals recomputed from activities, in one transaction.
+    Returns the number of rollup rows written.
+    """
+    day = func.date(Activity.created_at)
+
+    wipe = delete(UserDailyRollup)
+    source = (
+        select(
+            Activity.user_id,
+            day,
+            Activity.type,
+            func.coalesce(Activity.calculation_source, "local_factors"),
+            func.sum(Activity.co2_kg),
+            func.count(Activity.id),
+        )
+        .group_by(
+            Activity.user_id,
+            day,
+            Activity.type,
+            func.coalesce(Activity.calculation_source, "local_factors"),
+        )
+    )
+
+    if user_id:
+        wipe = wipe.where(UserDailyRollup.user_id == user_id)
+        source = source.where(Activity.user_id == user_id)
+    if since:
+        wipe = wipe.where(UserDailyRollup.day >= since)
+        source = source.where(Activity.created_at >= datetime.combine(since, datetime.min.time()))
+
+    try:
+        db.execute(wipe)
+        result = db.execute(
+            insert(UserDailyRollup).from_select(
+                ["user_id", "day", "type", "calculation_source", "co2_kg", "activity_count"],
+                source,
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return result.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild user_daily_rollup from activities")
+    parser.add_argument("--user", help="only rebuild this user_id")
+    parser.add_argument("--since", type=date.fromisoformat, help="only rebuild days >= YYYY-MM-DD")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        rows = rebuild_rollups(db, user_id=args.user, since=args.since)
+    finally:
+        db.close()
+    print(f"Rebuilt {rows} rollup rows in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# backend/app/services/rules.py
+"""
+Rule-based fallback suggestions, driven by a declarative table.
+
+Each rule names an activity type, optionally a set of values for a key field
+(mode, food_category) and a (min, max] range on a quantity field
+(distance_km, kwh), plus the suggestions it yields. The table is compiled
+once into a dict index on (type, key value) with rules sorted by max, so an
+activity costs one dict lookup and a bisect; templates without placeholders
+are pre-rendered.
+
+Within a (type, key value) the rule with the smallest matching max wins, so
+max-only rules read like an if/elif chain and a rule without max is the else.
+With no match, the table's fallback is used.
+Set SUGGESTION_RULES_PATH to a JSON file with the same shape as DEFAULT_TABLE
+to change rules without a deploy - it is re-read when its mtime changes
+(checked at most every SUGGESTION_RULES_RELOAD_SECONDS). A file that fails
+to load is reported and the previous rules stay in use.
+"""
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+RULES_PATH = os.getenv("SUGGESTION_RULES_PATH")
+RELOAD_SECONDS = float(os.getenv("SUGGESTION_RULES_RELOAD_SECONDS", "5"))
+
+# -------------------------------------------------
+# RULE TABLE
+# -------------------------------------------------
+
+DEFAULT_TABLE = {
+    "max_suggestions": 2,
+    "rules": [
+        # travel
+        {"type": "travel", "key": "mode", "in": ["bike", "bicycle", "cycle"], "quantity": "distance_km",
+         "suggestions": [
+             {"text": "Cycling for {distance_km:.1f} km is a low-carbon choice. Keep using it for short daily trips.", "difficulty": "easy"},
+             {"text": "You could replace another short trip this week with cycling to maintain this habit.", "difficulty": "easy"},
+         ]},
+        {"type": "travel", "key": "mode", "in": ["walk"],
+         "suggestions": [
+             {"text": "Walking produces almost zero emissions. Consider using it for all trips under 2 km.", "difficulty": "easy"},
+         ]},
+        {"type": "travel", "key": "mode", "in": ["train"],
+         "suggestions": [
+             {"text": "Train travel has lower emissions per km. Continue using it for medium-distance travel.", "difficulty": "easy"},
+         ]},
+        {"type": "travel", "key": "mode", "in": ["bus"],
+         "suggestions": [
+             {"text": "Public transport reduces per-person emissions. Prefer buses over private vehicles when possible.", "difficulty": "easy"},
+         ]},
+        {"type": "travel", "key": "mode", "in": ["car", "motorbike"], "quantity": "distance_km", "max": 5,
+         "suggestions": [
+             {"text": "For trips under {distance_km_int} km, walking or cycling could fully avoid emissions.", "difficulty": "easy"},
+         ]},
+        {"type": "travel", "key": "mode", "in": ["car", "motorbike"], "quantity": "distance_km", "max": 15,
+         "suggestions": [
+             {"text": "For medium trips, carpooling or public transport can reduce emissions significantly.", "difficulty": "medium"},
+         ]},
+        {"type": "travel", "key": "mode", "in": ["car", "motorbike"], "quantity": "distance_km",
+         "suggestions": [
+             {"text": "For long trips, combining errands into one journey can lower total emissions.", "difficulty": "medium"},
+         ]},
+
+        # electricity
+        {"type": "electricity", "quantity": "kwh", "max": 2,
+         "suggestions": [
+             {"text": "Your electricity usage is relatively low. Continue switching off unused devices.", "difficulty": "easy"},
+         ]},
+        {"type": "electricity", "quantity": "kwh", "max": 6,
+         "suggestions": [
+             {"text": "Reducing standby power and using LED lighting can cut daily electricity usage.", "difficulty": "easy"},
+         ]},
+        {"type": "electricity", "quantity": "kwh",
+         "suggestions": [
+             {"text": "High electricity usage detected. Limiting AC usage and unplugging idle devices can help.", "difficulty": "medium"},
+         ]},
+
+        # food
+        {"type": "food", "key": "food_category", "in": ["veg"],
+         "suggestions": [
+             {"text": "Vegetarian meals have lower carbon impact. Maintaining this diet reduces emissions.", "difficulty": "easy"},
+             {"text": "You could explore locally sourced vegetables to reduce transport emissions further.", "difficulty": "easy"},
+         ]},
+        {"type": "food", "key": "food_category", "in": ["chicken"],
+         "suggestions": [
+             {"text": "Chicken has lower emissions than red meat. Replacing some meals with vegetarian options helps more.", "difficulty": "medium"},
+         ]},
+        {"type": "food", "key": "food_category", "in": ["beef"],
+         "suggestions": [
+             {"text": "Beef has a high carbon footprint. Replacing even one meal with plant-based food helps.", "difficulty": "hard"},
+         ]},
+    ],
+    "fallback": [
+        {"text": "Small daily choices like saving energy and reducing travel add up over time.", "difficulty": "easy"},
+    ],
+}
+
+# -------------------------------------------------
+# COMPILED ENGINE
+# -------------------------------------------------
+
+class _Values(dict):
+    # `<quantity>_int` is computed only if a template asks for it
+    def __missing__(self, key):
+        if key.endswith("_int"):
+            return int(self[key[:-4]])
+        raise KeyError(key)
+
+
+class _Template:
+    __slots__ = ("text", "difficulty", "dynamic")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.text = spec["text"]
+        self.difficulty = spec.get("difficulty", "easy")
+        self.dynamic = "{" in self.text
+
+    def render(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        text = self.text.format_map(values) if self.dynamic else self.text
+        return {"text": text, "difficulty": self.difficulty}
+
+
+class _Rule:
+    __slots__ = ("quantity", "min", "max", "templates")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.quantity = spec.get("quantity")
+        self.min = spec.get("min")
+        self.max = spec.get("max")
+        self.templates = [_Template(s) for s in spec["suggestions"]]
+        # fail at load time, not on the request path, for bad placeholders
+        sample = _Values({self.quantity: 1.0} if self.quantity else {})
+        for t in self.templates:
+            t.render(sample)
+
+
+class RuleEngine:
+    def __init__(self, table: Dict[str, Any]):
+        self.max_suggestions = int(table.get("max_suggestions", 2))
+        self.fallback = [_Template(s) for s in table["fallback"]]
+        self._keys = {}     # type -> key field (None: type-wide rules only)
+        self._index = {}    # (type, key value or None) -> (maxes, rules) sorted by max
+
+        buckets = {}
+        for spec in table["rules"]:
+            typ, key = spec["type"], spec.get("key")
+            if self._keys.setdefault(typ, key) != key:
+                raise ValueError(f"rules for {typ!r} use more than one key field")
+            values = [v.lower() for v in spec["in"]] if key else [None]
+            rule = _Rule(spec)
+            for value in values:
+                existing = buckets.get((typ, value))
+                if existing and existing[0].quantity != rule.quantity:
+                    raise ValueError(f"rules for {typ!r}/{value!r} use more than one quantity")
+                buckets.setdefault((typ, value), []).append(rule)
+
+        inf = float("inf")
+        for bucket_key, rules in buckets.items():
+            rules.sort(key=lambda r: inf if r.max is None else r.max)
+            self._index[bucket_key] = ([inf if r.max is None else r.max for r in rules], rules)
+
+    def _match(self, activity: Dict[str, Any]):
+        typ = activity.get("type")
+        if typ not in self._keys:
+            return None, None
+        key = self._keys[typ]
+        value = (activity.get(key) or "").lower() if key else None
+        entry = self._index.get((typ, value))
+        if entry is None:
+            return None, None
+
+        maxes, rules = entry
+        quantity = rules[0].quantity
+        if quantity is None:
+            return rules[0], None
+
+        amount = float(activity.get(quantity) or 0)
+        for rule in rules[bisect_left(maxes, amount):]:
+            if (rule.max is None or amount <= rule.max) and (rule.min is None or amount > rule.min):
+                return rule, _Values({quantity: amount})
+        return None, None
+
+    def evaluate(self, activity: Dict[str, Any]) -> List[Dict[str, Any]]:
+        rule, values = self._match(activity)
+        templates = rule.templates if rule else self.fallback
+        return [t.render(values) for t in templates[:self.max_suggestions]]
+
+    def evaluate_many(self, activities: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return [self.evaluate(a) for a in activities]
+
+# -------------------------------------------------
+# LOADING / HOT RELOAD
+# -------------------------------------------------
+
+_engine = RuleEngine(DEFAULT_TABLE)
+_loaded_mtime: Optional[float] = None
+_checked_at = float("-inf")
+_lock = threading.Lock()
+
+def _maybe_reload():
+    global _engine, _loaded_mtime, _checked_at
+    now = time.monotonic()
+    if not RULES_PATH or now - _checked_at < RELOAD_SECONDS:
+        return
+    with _lock:
+        if now - _checked_at < RELOAD_SECONDS:
+            return
+        _checked_at = now
+        try:
+            mtime = os.path.getmtime(RULES_PATH)
+            if mtime == _loaded_mtime:
+                return
+            with open(RULES_PATH) as f:
+                engine = RuleEngine(json.load(f))
+        except Exception as e:
+            print("Failed to load suggestion rules, keeping current ones:", e)
+            return
+        _engine, _loaded_mtime = engine, mtime
+        print("Loaded suggestion rules from", RULES_PATH)
+
+def get_engine() -> RuleEngine:
+    _maybe_reload()
+    return _engine
@@ -0,0 +1,187 @@
+# backend/app/services/sql_profiler.py
+"""
+Opt-in SQL profiler for staging (SQL_PROFILE=true).
+
+Every statement is tagged with the id of the unit of work running it, an
+HTTP request (X-Request-ID, or a generated id echoed back in that header)
+or a consumer message, as a trailing `/* request_id=... */` comment, so it
+can be found in the database's own logs and pg_stat_activity.
+
+    slow queries   statements over SQL_SLOW_MS are printed with their
+                   parameters and EXPLAIN plan (SQL_PROFILE_EXPLAIN)
+    N+1            a unit that runs one statement shape (literals, params
+                   IN-lists and multi-row VALUES normalised away) more than
+                   SQL_NPLUS1_THRESHOLD times is reported when it ends
+
+Keep it off in production: the tag makes every statement text unique, which
+defeats asyncpg's prepared-statement cache.
+"""
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+ENABLED = os.getenv("SQL_PROFILE", "false") == "true"
+SLOW_SECONDS = float(os.getenv("SQL_SLOW_MS", "200")) / 1000
+EXPLAIN = os.getenv("SQL_PROFILE_EXPLAIN", "true") == "true"
+NPLUS1_THRESHOLD = int(os.getenv("SQL_NPLUS1_THRESHOLD", "5"))
+
+MAX_PARAMS_CHARS = 500
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# --------------------------------------------------
+# Units of work
+# --------------------------------------------------
+
+class _Unit:
+    __slots__ = ("id", "label", "queries", "seconds", "shapes")
+
+    def __init__(self, unit_id: str, label: str):
+        self.id = unit_id
+        self.label = label
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+
+_unit: ContextVar[Optional[_Unit]] = ContextVar("sql_profiler_unit", default=None)
+
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.:-]")
+
+def current_id() -> Optional[str]:
+    current = _unit.get()
+    return current.id if current else None
+
+def _report(work: _Unit):
+    repeated = [(n, shape) for shape, n in work.shapes.items() if n > NPLUS1_THRESHOLD]
+    if not repeated:
+        return
+    print(f"[sql] possible N+1 in {work.label} ({work.id}): "
+          f"{work.queries} statements, {work.seconds * 1000:.1f} ms")
+    for n, shape in sorted(repeated, reverse=True):
+        print(f"[sql]   {n}x {shape[:300]}")
+
+@contextmanager
+def unit(unit_id: Optional[str] = None, label: str = ""):
+    """
+    Attribute the statements run inside the block to one unit of work.
+    No-op unless SQL_PROFILE. Work handed to an executor must run in a copy
+    of this context (contextvars.copy_context().run) to be counted.
+    """
+    if not ENABLED:
+        yield None
+        return
+    current = _Unit(_SAFE_ID.sub("", str(unit_id or ""))[:64] or uuid.uuid4().hex[:16], label)
+    token = _unit.set(current)
+    try:
+        yield current.id
+    finally:
+        _unit.reset(token)
+        _report(current)
+
+# --------------------------------------------------
+# Statement shapes
+# --------------------------------------------------
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|\?|(?<!:):\w+")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SPACE = re.compile(r"\s+")
+
+_shapes: Dict[str, str] = {}
+
+def statement_shape(statement: str) -> str:
+    shape = _shapes.get(statement)
+    if shape is None:
+        shape = _STRING.sub("?", statement)
+        shape = _PARAM.sub("?", shape)
+        shape = _NUMBER.sub("?", shape)
+        shape = _LIST.sub("(?)", shape)
+        shape = _ROWS.sub("(?)", shape)      # multi-row VALUES
+        shape = _SPACE.sub(" ", shape).strip()
+        if len(_shapes) > 4096:
+            _shapes.clear()
+        _shapes[statement] = shape
+    return shape
+
+# --------------------------------------------------
+# SQLAlchemy hooks
+# --------------------------------------------------
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # raw DBAPI cursor: stays out of SQLAlchemy's events and the open result
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join("    " + " | ".join(str(c) for c in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+def _log_slow(conn, statement, parameters, executemany, elapsed, unit_id):
+    params = repr(parameters)
+    if len(params) > MAX_PARAMS_CHARS:
+        params = params[:MAX_PARAMS_CHARS] + "..."
+    print(f"[sql] slow statement ({elapsed * 1000:.1f} ms, {unit_id or '-'}): {statement}\n[sql]   params: {params}")
+    if not EXPLAIN or executemany or statement.lstrip().split(None, 1)[0].upper() not in EXPLAINABLE:
+        return
+    try:
+        print("[sql]   plan:\n" + _explain(conn, statement, parameters))
+    except Exception as e:
+        print("[sql]   EXPLAIN failed:", e)
+
+def install(engine):
+    """Hook a (sync) Engine. No-op unless SQL_PROFILE."""
+    if not ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["profiler_started"] = time.perf_counter()
+        current = _unit.get()
+        if current is not None:
+            shape = statement_shape(statement)
+            current.shapes[shape] = current.shapes.get(shape, 0) + 1
+            statement = f"{statement} /* request_id={current.id} */"
+        return statement, parameters
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("profiler_started", time.perf_counter())
+        current = _unit.get()
+        if current is not None:
+            current.queries += 1
+            current.seconds += elapsed
+        if elapsed >= SLOW_SECONDS:
+            _log_slow(conn, statement, parameters, executemany, elapsed, current.id if current else None)
+
+# --------------------------------------------------
+# ASGI middleware
+# --------------------------------------------------
+
+class ProfilerMiddleware:
+    """One unit per HTTP request; the id is echoed in X-Request-ID."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        with unit(incoming, f"{scope['method']} {scope['path']}") as request_id:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
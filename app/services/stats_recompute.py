@@ -0,0 +1,220 @@
+# backend/app/services/stats_recompute.py
+"""
+Set-based recompute of user_stats from user_daily_rollup.
+
+    python -m app.services.stats_recompute                      # yesterday (UTC)
+    python -m app.services.stats_recompute --start 2024-01-01 --end 2024-06-30
+    python -m app.services.stats_recompute --shards 16 --workers 4
+
+Users are split into shards by a hash of user_id (hashtext on Postgres, a
+registered crc32 function on SQLite) and shards run in a process pool. Each
+shard is one transaction: delete the shard's rows in [start, end], then a
+single INSERT ... SELECT computes daily totals (GROUP BY), points (CASE) and
+streaks (gaps-and-islands over window functions).
+
+A streak continues while days are consecutive and the total doesn't go up,
+matching update_user_stats. Streaks look back over the full history, so a
+range start mid-streak is still right.
+
+A day with no activity has no rollup rows, so nothing would reset the
+streak. The first idle day after an active one therefore gets a break row:
+0 kg, 0 points, streak 0. Later idle days get no row (the newest row
+already shows the break), which keeps user_stats one row per active day
+plus one per gap instead of one per user per day.
+"""
+import argparse
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (
+    BigInteger, Date, DateTime, Float, Integer, and_, case, cast, delete, event, func, insert, literal,
+    String, or_, select, union_all,
+)
+
+from app.db.session import SessionLocal, engine
+from app.db.models import UserDailyRollup, UserStats
+from app.services.gamification import _points_sql
+
+# --------------------------------------------------
+# Dialect helpers
+# --------------------------------------------------
+
+def _shard_expr(dialect: str, user_id, shards: int):
+    if dialect == "postgresql":
+        return func.mod(func.abs(cast(func.hashtext(user_id), BigInteger)), shards)
+    if dialect == "sqlite":
+        return func.crc32(user_id) % shards
+    raise NotImplementedError(f"sharding not supported on {dialect}")
+
+def _day_number(dialect: str, day):
+    # consecutive days -> consecutive integers
+    if dialect == "postgresql":
+        return day - cast(literal("1970-01-01"), UserDailyRollup.day.type)
+    return cast(func.julianday(day), BigInteger)
+
+def _next_day(dialect: str, day):
+    if dialect == "postgresql":
+        return day + 1
+    return func.date(day, "+1 day", type_=Date)
+
+def _day_to_datetime(dialect: str, day):
+    if dialect == "postgresql":
+        return cast(day, DateTime)
+    # same text SQLAlchemy writes for a midnight DateTime, so lookups still match
+    return cast(day, String).concat(" 00:00:00.000000")
+
+def _register_sqlite_functions(dbapi_conn, _record):
+    dbapi_conn.create_function(
+        "crc32", 1, lambda s: zlib.crc32(s.encode()) if s is not None else None, deterministic=True
+    )
+
+def _prepare_engine():
+    # fresh connections per process; never reuse ones inherited across fork
+    engine.dispose(close=False)
+    if engine.dialect.name == "sqlite" and not event.contains(engine, "connect", _register_sqlite_functions):
+        event.listen(engine, "connect", _register_sqlite_functions)
+
+# --------------------------------------------------
+# Recompute
+# --------------------------------------------------
+
+def _recompute_select(dialect: str, shard: int, shards: int, start: date, end: date):
+    r = UserDailyRollup
+    now = datetime.utcnow()
+    daily = (
+        select(r.user_id, r.day, func.sum(r.co2_kg).label("co2"))
+        .where(r.day <= end, _shard_expr(dialect, r.user_id, shards) == shard)
+        .group_by(r.user_id, r.day)
+        .subquery("daily")
+    )
+
+    # 1 where a new streak starts: a gap in days, or more CO2 than the day before
+    by_day = {"partition_by": daily.c.user_id, "order_by": daily.c.day}
+    day_no = _day_number(dialect, daily.c.day)
+    marked = select(
+        daily.c.user_id,
+        daily.c.day,
+        daily.c.co2,
+        case(
+            (and_(func.lag(day_no).over(**by_day) == day_no - 1,
+                  daily.c.co2 <= func.lag(daily.c.co2).over(**by_day)), 0),
+            else_=1,
+        ).label("brk"),
+    ).subquery("marked")
+
+    islands = select(
+        marked.c.user_id,
+        marked.c.day,
+        marked.c.co2,
+        func.sum(marked.c.brk).over(partition_by=marked.c.user_id, order_by=marked.c.day).label("island"),
+    ).subquery("islands")
+
+    # streaks are numbered before the day >= start filter, over full history
+    streaks = select(
+        islands.c.user_id,
+        islands.c.day,
+        islands.c.co2,
+        func.row_number().over(
+            partition_by=(islands.c.user_id, islands.c.island), order_by=islands.c.day
+        ).label("streak"),
+    ).subquery("streaks")
+
+    active = select(
+        streaks.c.user_id,
+        _day_to_datetime(dialect, streaks.c.day),
+        streaks.c.co2,
+        _points_sql(streaks.c.co2),
+        streaks.c.streak,
+        literal(now, DateTime),
+        literal(now, DateTime),
+    ).where(streaks.c.day >= start)
+
+    # break rows: the day after an active day, when that day had no activity
+    following = select(
+        daily.c.user_id,
+        daily.c.day,
+        day_no.label("day_no"),
+        func.lead(day_no).over(**by_day).label("next_no"),
+    ).subquery("following")
+    idle = _next_day(dialect, following.c.day)
+    breaks = select(
+        following.c.user_id,
+        _day_to_datetime(dialect, idle),
+        literal(0.0, Float),
+        literal(0, Integer),
+        literal(0, Integer),
+        literal(now, DateTime),
+        literal(now, DateTime),
+    ).where(
+        or_(following.c.next_no.is_(None), following.c.next_no != following.c.day_no + 1),
+        idle >= start,
+        idle <= end,
+    )
+
+    return union_all(active, breaks)
+
+def recompute_shard(shard: int, shards: int, start: date, end: date) -> int:
+    """Rewrite one shard's user_stats rows for [start, end]; returns rows written."""
+    dialect = engine.dialect.name
+    db = SessionLocal()
+    try:
+        db.execute(
+            delete(UserStats).where(
+                UserStats.date >= datetime.combine(start, datetime.min.time()),
+                UserStats.date < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+                _shard_expr(dialect, UserStats.user_id, shards) == shard,
+            ).execution_options(synchronize_session=False)
+        )
+        result = db.execute(
+            insert(UserStats).from_select(
+                ["user_id", "date", "daily_co2_kg", "points", "streak", "created_at", "updated_at"],
+                _recompute_select(dialect, shard, shards, start, end),
+            )
+        )
+        db.commit()
+        return result.rowcount
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def recompute_stats(start: date, end: date, shards: int = 8, workers: int = 4) -> int:
+    """Recompute every shard, `workers` at a time. Returns total rows written."""
+    if workers <= 1:
+        _prepare_engine()
+        return sum(recompute_shard(s, shards, start, end) for s in range(shards))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_prepare_engine) as pool:
+        futures = [pool.submit(recompute_shard, s, shards, start, end) for s in range(shards)]
+        return sum(f.result() for f in futures)
+
+
+def main():
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Recompute user_stats from the daily rollup")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day, YYYY-MM-DD (default: yesterday)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last day, YYYY-MM-DD (default: --start)")
+    parser.add_argument("--shards", type=int, default=8, help="user_id hash shards")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes (1 = run inline)")
+    args = parser.parse_args()
+
+    start = args.start or yesterday
+    end = args.end or start
+    if end < start:
+        parser.error("--end is before --start")
+
+    started = time.perf_counter()
+    rows = recompute_stats(start, end, shards=args.shards, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Recomputed {rows} user_stats rows for {start}..{end} "
+        f"({args.shards} shards, {args.workers} workers) in {elapsed:.2f}s "
+        f"= {rows / elapsed if elapsed else 0:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
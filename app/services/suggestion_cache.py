@@ -0,0 +1,216 @@
+# backend/app/services/suggestion_cache.py
+"""
+Cache for Gemini suggestion responses.
+
+Gemini runs at temperature 0.0, so equivalent prompts give equivalent
+answers. Prompts are reduced to a normalized signature (bucketed quantities
++ bucketed user context) and the parsed suggestions are cached under it:
+
+- in-process LRU with TTL (always on)
+- optional SQLite file tier that survives consumer restarts
+  (set SUGGESTION_CACHE_PATH)
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+
+CACHE_SIZE = int(os.getenv("SUGGESTION_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.getenv("SUGGESTION_CACHE_TTL", str(24 * 3600)))
+CACHE_PATH = os.getenv("SUGGESTION_CACHE_PATH")  # unset -> memory only
+
+# bump when the prompt changes so old answers aren't reused
+PROMPT_VERSION = "1"
+
+# bucket upper edges; aligned with the rule-based thresholds
+DISTANCE_EDGES = [2, 5, 10, 15, 30, 60, 150]
+KWH_EDGES = [1, 2, 4, 6, 10, 20]
+AVG_CO2_EDGES = [2, 5, 10, 20, 40]
+STREAK_EDGES = [0, 1, 3, 7, 14, 30]
+POINTS_EDGES = [0, 5, 10, 50, 200]
+
+# -------------------------------------------------
+# SIGNATURE
+# -------------------------------------------------
+
+def _bucket(value, edges: List[float]) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return bisect_right(edges, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def signature(activity: Dict[str, Any], user_ctx: Dict[str, Any], model: str = "") -> str:
+    typ = activity.get("type")
+    norm = {"v": PROMPT_VERSION, "model": model, "type": typ}
+
+    if typ == "travel":
+        norm["mode"] = (activity.get("mode") or "").lower()
+        norm["distance"] = _bucket(activity.get("distance_km"), DISTANCE_EDGES)
+    elif typ == "electricity":
+        norm["kwh"] = _bucket(activity.get("kwh"), KWH_EDGES)
+    elif typ == "food":
+        norm["category"] = (activity.get("food_category") or "").lower()
+
+    norm["ctx"] = [
+        _bucket(user_ctx.get("avg_daily_7d"), AVG_CO2_EDGES),
+        user_ctx.get("top_activity_type"),
+        _bucket(user_ctx.get("streak"), STREAK_EDGES),
+        _bucket(user_ctx.get("points"), POINTS_EDGES),
+    ]
+
+    raw = json.dumps(norm, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+# -------------------------------------------------
+# TIERS
+# -------------------------------------------------
+
+class _MemoryTier:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, expires_at: float = None):
+        with self._lock:
+            self._data[key] = (expires_at or time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _SqliteTier:
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS suggestion_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM suggestion_cache WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM suggestion_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO suggestion_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM suggestion_cache")
+            self._conn.commit()
+
+# -------------------------------------------------
+# CACHE
+# -------------------------------------------------
+
+class SuggestionCache:
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL, path: str = CACHE_PATH):
+        self.memory = _MemoryTier(maxsize, ttl)
+        self.disk = _SqliteTier(path, ttl) if path else None
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.disk is not None:
+            try:
+                value, expires_at = self.disk.get(key)
+            except Exception as e:
+                print("Suggestion cache disk read failed:", e)
+                value = None
+            if value is not None:
+                self._count("disk_hits")
+                self.memory.put(key, value, expires_at)
+                return value
+
+        self._count("misses")
+        return None
+
+    def put(self, key: str, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except Exception as e:
+                print("Suggestion cache disk write failed:", e)
+        self._count("stores")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["memory_size"] = len(self.memory)
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> SuggestionCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SuggestionCache()
+    return _cache
@@ -0,0 +1,54 @@
+# backend/app/services/tokens.py
+"""
+Stateless session tokens: base64url(JSON {"sub", "exp"}) + "." + HMAC-SHA256.
+
+Checking one is a hash and a compare - no DB read, no bcrypt. AUTH_SECRET must
+be set, and shared by every web worker. Without it no tokens are issued and
+none validate (the API refuses to start if AUTH_REQUIRED is on).
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Optional
+
+TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(24 * 3600)))  # seconds
+
+SECRET = (os.getenv("AUTH_SECRET") or "").encode() or None
+TOKENS_ENABLED = SECRET is not None
+
+class TokenSigningDisabled(RuntimeError):
+    pass
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(body: str) -> str:
+    return _b64encode(hmac.new(SECRET, body.encode(), hashlib.sha256).digest())
+
+def issue_token(user_id: str, ttl: int = TOKEN_TTL) -> str:
+    if not TOKENS_ENABLED:
+        raise TokenSigningDisabled("AUTH_SECRET is not set")
+    payload = {"sub": user_id, "exp": int(time.time()) + ttl}
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}"
+
+def verify_token(token: str) -> Optional[str]:
+    """The token's user_id, or None if it is malformed, forged or expired."""
+    if not TOKENS_ENABLED:
+        return None
+    try:
+        body, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(body)):
+            return None
+        payload = json.loads(_b64decode(body))
+        if payload["exp"] < time.time():
+            return None
+        return payload["sub"]
+    except (ValueError, KeyError, TypeError):
+        return None
@@ -0,0 +1,75 @@
+# backend/bench/fakes.py
+"""
+In-process stand-ins for the external services, so benchmarks measure the
+API and the database only. Each fake can add a fixed latency to model the
+real round trip.
+"""
+import json
+import time
+import asyncio
+import threading
+
+FAKE_TRAVEL_FACTOR = 0.17      # kg CO2e per km
+FAKE_ELECTRICITY_FACTOR = 0.45  # kg CO2e per kWh
+
+
+class FakePublisher:
+    """Replaces messaging.ActivityPublisher: every message is 'confirmed'."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.published = 0
+        self._lock = threading.Lock()
+
+    def publish_many(self, payloads: list):
+        from app.services.messaging import PublishResult
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.published += len(payloads)
+        return PublishResult(len(payloads), False)
+
+    def close(self):
+        pass
+
+
+def install(rabbit_latency: float = 0.0, climatiq_latency: float = 0.0, gemini_latency: float = 0.0):
+    """Patch messaging, Climatiq and Gemini. Call after importing the app."""
+    from app.services import messaging, climatiq, gemini
+
+    publisher = FakePublisher(rabbit_latency)
+    messaging.get_publisher = lambda: publisher
+
+    def _factor(activity_id, kind, country=None, region=None):
+        return FAKE_TRAVEL_FACTOR if kind == "distance" else FAKE_ELECTRICITY_FACTOR
+
+    def get_factor(activity_id, kind, country=None, region=None):
+        if climatiq_latency:
+            time.sleep(climatiq_latency)
+        return _factor(activity_id, kind, country, region)
+
+    async def get_factor_async(activity_id, kind, country=None, region=None):
+        if climatiq_latency:
+            await asyncio.sleep(climatiq_latency)
+        return _factor(activity_id, kind, country, region)
+
+    climatiq.get_factor = get_factor
+    climatiq.get_factor_async = get_factor_async
+
+    canned = json.dumps([{"text": "Try one car-free day this week.", "difficulty": "easy"}])
+
+    def generate(prompt):
+        if gemini_latency:
+            time.sleep(gemini_latency)
+        return canned
+
+    async def generate_async(prompt):
+        if gemini_latency:
+            await asyncio.sleep(gemini_latency)
+        return canned
+
+    gemini.generate = generate
+    gemini.generate_async = generate_async
+
+    return publisher
@@ -0,0 +1,344 @@
+# backend/bench/run.py
+"""
+API latency benchmarks.
+
+Boots the FastAPI app in-process (ASGI, no sockets) against a fresh SQLite
+file or a given database, with RabbitMQ, Climatiq and Gemini replaced by the
+fakes in bench/fakes.py, then drives concurrent workloads:
+
+    ingest     - POST /activities (plus some batches and summary reads)
+    dashboard  - the per-user read endpoints a client polls
+    login      - a burst of POST /auth/login (bcrypt bound)
+
+    python -m bench.run                                        # all workloads
+    python -m bench.run --workload ingest --concurrency 32 --duration 20
+    python -m bench.run --database-url postgresql://user:pw@localhost/bench
+    python -m bench.run --out results.json --baseline bench/baseline.json
+    python -m bench.run --save-baseline bench/baseline.json
+
+Results are JSON (per workload: throughput, and per route count, errors and
+latency percentiles in ms). With --baseline, p50/p99/rps are compared per
+route and anything worse than --tolerance is reported as a regression
+(exit code 1 with --fail-on-regression).
+
+bench/baseline.json is the reference run: default settings on SQLite,
+ingest and dashboard only (its "meta" block records the machine and
+commit). Latencies are machine-specific, so re-record it with
+--save-baseline on the machine that runs the comparison.
+
+The outbox relay runs in-process (OUTBOX_RELAY_IN_PROCESS=true, safe with
+one process), so ingest includes its database load and the fake publisher.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+WORKLOADS = ("ingest", "dashboard", "login")
+TRAVEL_MODES = ["car", "bus", "train", "bike", "walk", "motorbike"]
+FOOD = ["veg", "chicken", "beef"]
+PASSWORD = "bench-password"
+
+# --------------------------------------------------
+# Request mixes
+# --------------------------------------------------
+
+def _activity(rng: random.Random, user_id: str) -> dict:
+    typ = rng.choice(["travel", "travel", "electricity", "food"])
+    if typ == "travel":
+        return {"user_id": user_id, "type": typ, "mode": rng.choice(TRAVEL_MODES),
+                "distance_km": round(rng.uniform(0.5, 60), 1)}
+    if typ == "electricity":
+        return {"user_id": user_id, "type": typ, "kwh": round(rng.uniform(0.5, 12), 1)}
+    return {"user_id": user_id, "type": typ, "food_category": rng.choice(FOOD)}
+
+def ingest_op(rng: random.Random, users: list):
+    user = rng.choice(users)
+    roll = rng.random()
+    if roll < 0.85:
+        return "POST /activities", "POST", "/activities/", {"json": _activity(rng, user)}
+    if roll < 0.90:
+        items = [_activity(rng, user) for _ in range(20)]
+        return "POST /activities/batch", "POST", "/activities/batch", {"json": {"items": items}}
+    return "GET /summary/users/{id}", "GET", f"/summary/users/{user}", {"params": {"period": "day"}}
+
+DASHBOARD_ROUTES = [
+    ("GET /summary/users/{id}", "/summary/users/{u}", {"period": "week"}),
+    ("GET /summary/users/{id}/timeseries", "/summary/users/{u}/timeseries", {"bucket": "day", "days": 30}),
+    ("GET /summary/{id}", "/summary/{u}", None),
+    ("GET /user-stats/{id}", "/user-stats/{u}", None),
+    ("GET /gamification/users/{id}", "/gamification/users/{u}", None),
+    ("GET /gamification/users/{id}/rank", "/gamification/users/{u}/rank", {"board": "weekly"}),
+    ("GET /gamification/leaderboard", "/gamification/leaderboard", {"k": 10}),
+    ("GET /suggestions/users/{id}", "/suggestions/users/{u}", {"limit": 20}),
+    ("GET /activities", "/activities/", "user"),
+]
+
+def dashboard_op(rng: random.Random, users: list):
+    user = rng.choice(users)
+    label, path, params = rng.choice(DASHBOARD_ROUTES)
+    if params == "user":
+        params = {"user_id": user, "limit": 20}
+    return label, "GET", path.format(u=user), {"params": params} if params else {}
+
+def login_op(rng: random.Random, users: list):
+    return "POST /auth/login", "POST", "/auth/login", {"json": {"username": rng.choice(users), "password": PASSWORD}}
+
+# --------------------------------------------------
+# Setup per workload
+# --------------------------------------------------
+
+async def setup_dashboard(client, users: list, seed: int):
+    from app.db.session import SessionLocal
+    from app.services.gamification import update_user_stats
+
+    rng = random.Random(seed)
+    for user in users:
+        items = [_activity(rng, user) for _ in range(30)]
+        r = await client.post("/activities/batch", json={"items": items})
+        r.raise_for_status()
+
+    # what the consumer would do once the messages arrive
+    db = SessionLocal()
+    try:
+        for user in users:
+            update_user_stats(db, user)
+    finally:
+        db.close()
+
+async def setup_login(client, users: list, seed: int):
+    for user in users:
+        r = await client.post("/auth/register", json={"username": user, "password": PASSWORD})
+        r.raise_for_status()
+
+SETUP = {"dashboard": setup_dashboard, "login": setup_login}
+OPS = {"ingest": ingest_op, "dashboard": dashboard_op, "login": login_op}
+
+# --------------------------------------------------
+# Driver
+# --------------------------------------------------
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    # nearest rank
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+def _summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(_percentile(ms, 50), 3),
+        "p90_ms": round(_percentile(ms, 90), 3),
+        "p99_ms": round(_percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+
+async def drive(client, op, users: list, concurrency: int, duration: float, seed: int, record: bool = True):
+    samples = {}   # label -> [seconds]
+    errors = {}    # label -> count
+    first_error = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(wid: int):
+        rng = random.Random(seed * 1000 + wid)
+        while time.perf_counter() < deadline:
+            label, method, url, kwargs = op(rng, users)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                ok = response.status_code < 400
+                error = None if ok else f"HTTP {response.status_code}: {response.text[:200]}"
+            except Exception as e:
+                ok, error = False, repr(e)
+            elapsed = time.perf_counter() - started
+            if record:
+                samples.setdefault(label, []).append(elapsed)
+                if not ok:
+                    errors[label] = errors.get(label, 0) + 1
+                    first_error.setdefault(label, error)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [x for values in samples.values() for x in values]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "overall": _summarize(all_latencies, sum(errors.values()), elapsed),
+        "routes": {
+            label: _summarize(values, errors.get(label, 0), elapsed)
+            for label, values in sorted(samples.items())
+        },
+        "first_errors": first_error,
+    }
+
+async def run_workloads(args) -> dict:
+    import httpx
+    from app.main import app
+    from bench import fakes
+
+    fakes.install(args.rabbit_latency_ms / 1000, args.climatiq_latency_ms / 1000, args.gemini_latency_ms / 1000)
+
+    run_id = uuid.uuid4().hex[:8]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name in args.workloads:
+                users = [f"bench-{run_id}-{name}-{i}" for i in range(args.users)]
+                if name in SETUP:
+                    print(f"[{name}] setup ({len(users)} users)...")
+                    await SETUP[name](client, users, args.seed)
+                if args.warmup:
+                    await drive(client, OPS[name], users, args.concurrency, args.warmup, args.seed, record=False)
+                print(f"[{name}] running {args.duration}s at concurrency {args.concurrency}...")
+                results[name] = await drive(client, OPS[name], users, args.concurrency, args.duration, args.seed + 1)
+                o = results[name]["overall"]
+                print(f"[{name}] {o['count']} requests, {o['errors']} errors, {o['rps']} req/s, "
+                      f"p50 {o['p50_ms']} ms, p99 {o['p99_ms']} ms")
+    return results
+
+# --------------------------------------------------
+# Baseline comparison
+# --------------------------------------------------
+
+# metric -> True if a higher value is worse
+COMPARED = {"p50_ms": True, "p99_ms": True, "rps": False}
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Rows of (workload, route, metric, baseline, current, change, regressed)."""
+    rows = []
+    for workload, data in results["workloads"].items():
+        base = baseline.get("workloads", {}).get(workload)
+        if not base:
+            continue
+        for route, current in data["routes"].items():
+            before = base["routes"].get(route)
+            if not before:
+                continue
+            for metric, higher_is_worse in COMPARED.items():
+                old, new = before[metric], current[metric]
+                if not old:
+                    continue
+                change = (new - old) / old
+                regressed = change > tolerance if higher_is_worse else change < -tolerance
+                rows.append((workload, route, metric, old, new, change, regressed))
+    return rows
+
+def print_comparison(rows: list):
+    print(f"\n{'workload':<10} {'route':<38} {'metric':<7} {'baseline':>10} {'current':>10} {'change':>8}")
+    for workload, route, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{workload:<10} {route:<38} {metric:<7} {old:>10.2f} {new:>10.2f} {change:>+7.1%}{flag}")
+
+# --------------------------------------------------
+# Entry point
+# --------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def _configure_env(args):
+    # must happen before anything under app/ is imported
+    if not args.database_url:
+        path = os.path.join(tempfile.mkdtemp(prefix="carbon-bench-"), "bench.db")
+        args.database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["CLIMATIQ_API_KEY"] = "bench-fake"       # take the factor path (faked)
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ.setdefault("AUTH_SECRET", "bench-secret")
+    os.environ["AUTH_REQUIRED"] = "false"
+    # one process, so one relay: safe on SQLite too. Keeps the outbox relay
+    # (and the fake publisher) in the measured load, as on Postgres.
+    os.environ["OUTBOX_RELAY_IN_PROCESS"] = "true"
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process API latency benchmarks")
+    parser.add_argument("--workload", action="append", choices=WORKLOADS, dest="workloads",
+                        help="repeatable; default: all")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per workload")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unrecorded seconds before each workload")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--no-response-cache", action="store_true")
+    parser.add_argument("--rabbit-latency-ms", type=float, default=2.0)
+    parser.add_argument("--climatiq-latency-ms", type=float, default=0.0)
+    parser.add_argument("--gemini-latency-ms", type=float, default=0.0)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="also write results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    args.workloads = args.workloads or list(WORKLOADS)
+
+    _configure_env(args)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+    from app.db.session import engine, init_db
+    init_db()
+
+    workloads = asyncio.run(run_workloads(args))
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "users": args.users,
+            "seed": args.seed,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "response_cache": not args.no_response_cache,
+        },
+        "workloads": workloads,
+    }
+
+    payload = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload + "\n")
+        print("Results written to", args.out)
+    else:
+        print(payload)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(payload + "\n")
+        print("Baseline written to", args.save_baseline)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.tolerance)
+        print_comparison(rows)
+        regressions = [r for r in rows if r[-1]]
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
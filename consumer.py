@@ -2,14 +2,26 @@
 import os
 import json
 import time
+import signal
+import asyncio
+import argparse
 import traceback
-from app.services.messaging import _get_connection_params
+import contextvars
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from app.services.messaging import _get_connection_params, RABBITMQ_URL
 import pika
-from app.db.session import SessionLocal, init_db
-from app.db.crud import create_suggestion, delete_fallback_suggestions_for_activity
-from app.services.ai_service import generate_suggestions_for_activity
+from app.db.session import SessionLocal
+from app.db.crud import replace_suggestions_for_activities
+from app.services.ai_service import (
+    generate_suggestions_for_activity,
+    generate_suggestions_for_activity_async,
+    get_user_context
+)
 from sqlalchemy.orm import Session
 from app.services.gamification import update_user_stats
+from app.services.response_cache import bump_user
+from app.services import sql_profiler
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -19,11 +31,59 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 print("DEBUG CONSUMER GEMINI:", bool(os.getenv("GEMINI_API_KEY")))
 print("DEBUG CONSUMER CLIMATIQ:", bool(os.getenv("CLIMATIQ_API_KEY")))
 
-init_db()
-
 QUEUE = os.getenv("RABBIT_QUEUE", "activities")
 # params = _get_connection_params()
 
+# async mode: messages buffered by the broker / handled at once
+PREFETCH = int(os.getenv("CONSUMER_PREFETCH", "32"))
+CONCURRENCY = int(os.getenv("CONSUMER_CONCURRENCY", "8"))
+
+# batch mode: flush after this many messages or this long after the first one
+BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "50"))
+BATCH_WAIT_MS = int(os.getenv("CONSUMER_BATCH_WAIT_MS", "200"))
+
+def _suggestion_source() -> str:
+    return "ai" if os.getenv("USE_GEMINI","false")=="true" else "rule"
+
+def _activity_day(data: dict):
+    # stats are kept per UTC day of the activity, not of processing
+    try:
+        return datetime.fromisoformat(data["created_at"]).date()
+    except (KeyError, TypeError, ValueError):
+        return datetime.utcnow().date()
+
+def _suggestion_rows(data: dict, suggestions: list) -> list:
+    source = _suggestion_source()
+    return [
+        {
+            "user_id": data.get("user_id"),
+            "activity_id": data.get("activity_id"),
+            "text": s.get("text"),
+            "est_saving": s.get("est_saving_kg", 0.0),
+            "difficulty": s.get("difficulty"),
+            "meta": s,
+            "source": source
+        }
+        for s in suggestions
+    ]
+
+def _store_results(data: dict, suggestions: list):
+    # suggestions + stats in one transaction / one commit
+    user_id = data.get("user_id")
+    db: Session = SessionLocal()
+    try:
+        replace_suggestions_for_activities(
+            db, [data.get("activity_id")], _suggestion_rows(data, suggestions), commit=False
+        )
+        update_user_stats(db, user_id, _activity_day(data), commit=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    bump_user(user_id)
+
 def handle_message(body: bytes):
     try:
         print("📩 Received message:", body.decode())
@@ -34,26 +94,10 @@ def handle_message(body: bytes):
 
         print(f"⚙️ Processing activity {activity_id} for user {user_id}")
 
-        suggestions = generate_suggestions_for_activity(data)
-        db: Session = SessionLocal()
-
-        delete_fallback_suggestions_for_activity(db, activity_id)
+        with sql_profiler.unit(f"msg-{activity_id}", "handle_message"):
+            suggestions = generate_suggestions_for_activity(data)
+            _store_results(data, suggestions)
 
-        for s in suggestions:
-            create_suggestion(
-                db,
-                user_id=user_id,
-                activity_id=activity_id,
-                text=s.get("text"),
-                est_saving=s.get("est_saving_kg", 0.0),
-                difficulty=s.get("difficulty"),
-                meta=s,
-                source="ai" if os.getenv("USE_GEMINI","false")=="true" else "rule"
-            )
-
-        update_user_stats(db, user_id)
-
-        db.close()
         print("✅ Done processing activity", activity_id)
         return True
 
@@ -63,6 +107,74 @@ def handle_message(body: bytes):
         return False
 
 
+def handle_batch(bodies: list) -> list:
+    """
+    Process many messages at once. Context and user stats are computed once
+    per user, and all suggestion changes for the batch are written in one
+    transaction. Returns one bool per body. If the batch write fails, each
+    message is retried on its own so one bad message can't sink the batch.
+    """
+    results = [False] * len(bodies)
+    by_user = {}
+    for i, body in enumerate(bodies):
+        try:
+            data = json.loads(body)
+        except Exception as e:
+            print("❌ Dropping unparseable message:", e)
+            continue
+        by_user.setdefault(data.get("user_id"), []).append((i, data))
+
+    if not by_user:
+        return results
+
+    print(f"⚙️ Processing batch of {len(bodies)} messages for {len(by_user)} users")
+
+    # statements are tagged with the batch's first activity id and its size
+    first_id = next(iter(by_user.values()))[0][1].get("activity_id")
+    try:
+        with sql_profiler.unit(f"batch-{first_id}-{len(bodies)}", "handle_batch"):
+            # LLM / context work happens before the write transaction opens
+            activity_ids = []
+            rows = []
+            days = set()  # (user_id, day) stats rows to refresh
+            for user_id, items in by_user.items():
+                user_ctx = get_user_context(user_id) if user_id else {}
+                for _, data in items:
+                    activity_id = data.get("activity_id")
+                    activity_ids.append(activity_id)
+                    if user_id:
+                        days.add((user_id, _activity_day(data)))
+                    rows.extend(_suggestion_rows(data, generate_suggestions_for_activity(data, user_ctx=user_ctx)))
+
+            db: Session = SessionLocal()
+            try:
+                replace_suggestions_for_activities(db, activity_ids, rows, commit=False)
+                # sorted so concurrent batches lock stats rows in the same order
+                for user_id, day in sorted(days):
+                    update_user_stats(db, user_id, day, commit=False)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            for user_id in by_user:
+                bump_user(user_id)
+
+    except Exception as e:
+        print("❌ Batch failed, retrying messages one by one:", e)
+        traceback.print_exc()
+        for items in by_user.values():
+            for i, _ in items:
+                results[i] = handle_message(bodies[i])
+        return results
+
+    for items in by_user.values():
+        for i, _ in items:
+            results[i] = True
+    print(f"✅ Done processing batch of {len(activity_ids)} activities")
+    return results
+
 
 def consume():
     params = _get_connection_params()
@@ -84,5 +196,166 @@ def consume():
         channel.stop_consuming()
     conn.close()
 
+
+def consume_batched(batch_size: int = BATCH_SIZE, batch_wait_ms: int = BATCH_WAIT_MS):
+    """
+    Drain up to `batch_size` messages (or whatever arrived within
+    `batch_wait_ms` of the first one), process them with handle_batch and
+    then settle the whole batch.
+    """
+    params = _get_connection_params()
+    conn = pika.BlockingConnection(params)
+    channel = conn.channel()
+    channel.queue_declare(queue=QUEUE, durable=True)
+    channel.basic_qos(prefetch_count=batch_size)
+
+    wait = batch_wait_ms / 1000.0
+    pending = []   # (method, body)
+    deadline = None
+
+    def flush():
+        results = handle_batch([body for _, body in pending])
+        if all(results):
+            channel.basic_ack(delivery_tag=pending[-1][0].delivery_tag, multiple=True)
+            return
+        for (method, _), ok in zip(pending, results):
+            if ok:
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+            else:
+                # retry once on another delivery, then drop
+                channel.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+
+    print(f"Batch consumer started (size={batch_size}, wait={batch_wait_ms}ms). Waiting for messages...")
+    try:
+        for method, properties, body in channel.consume(QUEUE, inactivity_timeout=max(wait / 4, 0.01)):
+            if method is not None:
+                pending.append((method, body))
+                if deadline is None:
+                    deadline = time.monotonic() + wait
+            if pending and (len(pending) >= batch_size or time.monotonic() >= deadline):
+                flush()
+                pending = []
+                deadline = None
+    except KeyboardInterrupt:
+        print("Stopping consumer...")
+        if pending:
+            flush()
+        channel.cancel()
+    conn.close()
+
+
+async def consume_async(prefetch: int = PREFETCH, concurrency: int = CONCURRENCY):
+    """
+    asyncio consumer: up to `prefetch` unacked messages from the broker and
+    at most `concurrency` messages handled at once. Gemini is awaited through
+    its async client; the blocking DB work runs on a dedicated thread pool of
+    the same size. On SIGINT/SIGTERM it stops taking messages, lets in-flight
+    ones finish and ack, then closes; unstarted prefetched messages are
+    requeued by the broker when the channel closes.
+    """
+    import aio_pika
+
+    if not RABBITMQ_URL:
+        raise RuntimeError("RABBITMQ_URL not set")
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="consumer")
+    slots = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    stopping = asyncio.Event()
+
+    connection = await aio_pika.connect_robust(RABBITMQ_URL)
+    channel = await connection.channel()
+    await channel.set_qos(prefetch_count=prefetch)
+    queue = await channel.declare_queue(QUEUE, durable=True)
+
+    async def handle(body: bytes) -> bool:
+        try:
+            print("📩 Received message:", body.decode())
+            data = json.loads(body)
+            activity_id = data.get("activity_id")
+            print(f"⚙️ Processing activity {activity_id} for user {data.get('user_id')}")
+
+            user_id = data.get("user_id")
+            with sql_profiler.unit(f"msg-{activity_id}", "handle"):
+                # run_in_executor doesn't carry contextvars; the profiler needs them
+                ctx = contextvars.copy_context()
+                user_ctx = await loop.run_in_executor(executor, ctx.run, get_user_context, user_id) if user_id else {}
+                suggestions = await generate_suggestions_for_activity_async(data, user_ctx=user_ctx)
+                await loop.run_in_executor(executor, ctx.run, _store_results, data, suggestions)
+
+            print("✅ Done processing activity", activity_id)
+            return True
+        except Exception as e:
+            print("❌ Error handling message:", e)
+            traceback.print_exc()
+            return False
+
+    async def process(message):
+        try:
+            ok = await handle(message.body)
+            if ok:
+                await message.ack()
+            else:
+                # retry once on another delivery, then drop
+                await message.nack(requeue=not message.redelivered)
+        except Exception as e:
+            print("❌ Failed to settle message:", e)
+        finally:
+            slots.release()
+
+    async with queue.iterator() as messages:
+        def request_stop():
+            if not stopping.is_set():
+                print("Stopping consumer...")
+                stopping.set()
+                asyncio.ensure_future(messages.close())
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, request_stop)
+            except NotImplementedError:
+                pass
+
+        print(f"Async consumer started (prefetch={prefetch}, concurrency={concurrency}). Waiting for messages...")
+        try:
+            async for message in messages:
+                await slots.acquire()
+                if stopping.is_set():
+                    slots.release()
+                    break
+                task = asyncio.create_task(process(message))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        except asyncio.CancelledError:
+            pass
+
+        if in_flight:
+            print(f"Waiting for {len(in_flight)} in-flight messages...")
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    await connection.close()
+    executor.shutdown(wait=True)
+
+
 if __name__ == "__main__":
-    consume()
+    parser = argparse.ArgumentParser(description="Activities queue consumer")
+    parser.add_argument(
+        "--mode",
+        choices=["sync", "async", "batch"],
+        default=os.getenv("CONSUMER_MODE", "sync"),
+        help="sync: one message at a time (pika); async: concurrent (aio-pika); "
+             "batch: micro-batches grouped by user (pika)",
+    )
+    parser.add_argument("--prefetch", type=int, default=PREFETCH)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-wait-ms", type=int, default=BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    if args.mode == "async":
+        asyncio.run(consume_async(args.prefetch, args.concurrency))
+    elif args.mode == "batch":
+        consume_batched(args.batch_size, args.batch_wait_ms)
+    else:
+        consume()
@@ -0,0 +1,109 @@
+"""initial schema
+
+Matches what Base.metadata.create_all used to build at startup. Tables that
+already exist (databases created by the old init_db) are left untouched, so
+existing deployments can run `alembic upgrade head` directly.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("password_hash", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    if "activities" not in existing:
+        op.create_table(
+            "activities",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.String(), nullable=True),
+            sa.Column("type", sa.String(), nullable=True),
+            sa.Column("mode", sa.String(), nullable=True),
+            sa.Column("distance_km", sa.Float(), nullable=True),
+            sa.Column("kwh", sa.Float(), nullable=True),
+            sa.Column("food_category", sa.String(), nullable=True),
+            sa.Column("co2_kg", sa.Float(), nullable=False),
+            sa.Column("calculation_source", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("meta", sa.JSON(), nullable=True),
+        )
+        op.create_index("ix_activities_id", "activities", ["id"])
+        op.create_index("ix_activities_user_id", "activities", ["user_id"])
+        op.create_index("ix_activities_type", "activities", ["type"])
+
+    if "suggestions" not in existing:
+        op.create_table(
+            "suggestions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("activity_id", sa.Integer(), nullable=True),
+            sa.Column("user_id", sa.String(), nullable=True),
+            sa.Column("suggestion_text", sa.Text(), nullable=False),
+            sa.Column("est_saving_kg", sa.Float(), nullable=True),
+            sa.Column("difficulty", sa.String(), nullable=True),
+            sa.Column("source", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("meta", sa.JSON(), nullable=True),
+        )
+        op.create_index("ix_suggestions_id", "suggestions", ["id"])
+        op.create_index("ix_suggestions_user_id", "suggestions", ["user_id"])
+
+    if "user_stats" not in existing:
+        op.create_table(
+            "user_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.String(), nullable=False),
+            sa.Column("date", sa.DateTime(), nullable=False),
+            sa.Column("daily_co2_kg", sa.Float(), nullable=False),
+            sa.Column("points", sa.Integer(), nullable=True),
+            sa.Column("streak", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_user_stats_id", "user_stats", ["id"])
+        op.create_index("ix_user_stats_user_id", "user_stats", ["user_id"])
+        op.create_index("ix_user_stats_date", "user_stats", ["date"])
+
+    if "user_daily_rollup" not in existing:
+        op.create_table(
+            "user_daily_rollup",
+            sa.Column("user_id", sa.String(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("calculation_source", sa.String(), nullable=False),
+            sa.Column("co2_kg", sa.Float(), nullable=False),
+            sa.Column("activity_count", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("user_id", "day", "type", "calculation_source"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_daily_rollup")
+    op.drop_table("user_stats")
+    op.drop_table("suggestions")
+    op.drop_table("activities")
+    op.drop_table("users")
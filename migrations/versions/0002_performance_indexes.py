@@ -0,0 +1,64 @@
+"""performance indexes
+
+Composite indexes for the hot per-user queries, plus a unique
+(user_id, date) index on user_stats. Single-column user_id indexes that
+become a left prefix of a composite are dropped. On Postgres the indexes
+are built CONCURRENTLY so the migration doesn't block writes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name, table, columns, **kw):
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+    else:
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # update_user_stats used to miss today's row and insert duplicates;
+    # keep the newest row per (user_id, date) so the unique index can build
+    op.execute(
+        "DELETE FROM user_stats WHERE id NOT IN "
+        "(SELECT max_id FROM (SELECT MAX(id) AS max_id FROM user_stats GROUP BY user_id, date) AS keep)"
+    )
+
+    _create_index("ix_activities_user_id_created_at", "activities", ["user_id", "created_at"])
+    _create_index(
+        "ix_suggestions_user_id_created_at", "suggestions", ["user_id", sa.text("created_at DESC")]
+    )
+    _create_index("ix_suggestions_activity_id_source", "suggestions", ["activity_id", "source"])
+    _create_index("ux_user_stats_user_id_date", "user_stats", ["user_id", "date"], unique=True)
+
+    op.drop_index("ix_activities_user_id", table_name="activities")
+    op.drop_index("ix_suggestions_user_id", table_name="suggestions")
+    op.drop_index("ix_user_stats_user_id", table_name="user_stats")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_user_stats_user_id", "user_stats", ["user_id"])
+    op.create_index("ix_suggestions_user_id", "suggestions", ["user_id"])
+    op.create_index("ix_activities_user_id", "activities", ["user_id"])
+
+    op.drop_index("ux_user_stats_user_id_date", table_name="user_stats")
+    op.drop_index("ix_suggestions_activity_id_source", table_name="suggestions")
+    op.drop_index("ix_suggestions_user_id_created_at", table_name="suggestions")
+    op.drop_index("ix_activities_user_id_created_at", table_name="activities")
@@ -0,0 +1,55 @@
+"""keyset pagination indexes
+
+Extends the per-user listing indexes with the id tiebreaker so
+ORDER BY created_at DESC, id DESC + (created_at, id) < cursor is served
+straight from the index, and adds (created_at, id) for the unfiltered
+activity listing.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name, table, columns, **kw):
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+    else:
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _create_index("ix_activities_user_id_created_at_id", "activities", ["user_id", "created_at", "id"])
+    _create_index("ix_activities_created_at_id", "activities", ["created_at", "id"])
+    _create_index(
+        "ix_suggestions_user_id_created_at_id",
+        "suggestions",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+
+    op.drop_index("ix_activities_user_id_created_at", table_name="activities")
+    op.drop_index("ix_suggestions_user_id_created_at", table_name="suggestions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_suggestions_user_id_created_at", "suggestions", ["user_id", sa.text("created_at DESC")])
+    op.create_index("ix_activities_user_id_created_at", "activities", ["user_id", "created_at"])
+
+    op.drop_index("ix_suggestions_user_id_created_at_id", table_name="suggestions")
+    op.drop_index("ix_activities_created_at_id", table_name="activities")
+    op.drop_index("ix_activities_user_id_created_at_id", table_name="activities")
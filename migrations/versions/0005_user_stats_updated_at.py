@@ -0,0 +1,35 @@
+"""user_stats.updated_at
+
+Stamped on every stats write so web processes can pull changed rows into
+their in-memory leaderboards instead of rebuilding them on a timer.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("user_stats", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_user_stats_updated_at", "user_stats", ["updated_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_user_stats_updated_at", table_name="user_stats")
+    # batch mode: SQLite can't drop columns in place
+    with op.batch_alter_table("user_stats") as batch:
+        batch.drop_column("updated_at")
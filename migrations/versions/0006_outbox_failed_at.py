@@ -0,0 +1,50 @@
+"""activity_outbox.failed_at
+
+Rows that keep failing to publish are parked (failed_at set) after
+OUTBOX_MAX_ATTEMPTS instead of blocking every row behind them. The pending
+index now also excludes parked rows.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("activity_outbox", sa.Column("failed_at", sa.DateTime(), nullable=True))
+    op.drop_index("ix_activity_outbox_pending", table_name="activity_outbox")
+    op.create_index(
+        "ix_activity_outbox_pending",
+        "activity_outbox",
+        ["id"],
+        postgresql_where=sa.text("sent_at IS NULL AND failed_at IS NULL"),
+        sqlite_where=sa.text("sent_at IS NULL AND failed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_activity_outbox_pending", table_name="activity_outbox")
+    op.create_index(
+        "ix_activity_outbox_pending",
+        "activity_outbox",
+        ["id"],
+        postgresql_where=sa.text("sent_at IS NULL"),
+        sqlite_where=sa.text("sent_at IS NULL"),
+    )
+    # batch mode: SQLite can't drop columns in place
+    with op.batch_alter_table("activity_outbox") as batch:
+        batch.drop_column("failed_at")
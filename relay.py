@@ -0,0 +1,48 @@
+# backend/relay.py
+"""
+Standalone outbox relay: publishes activity_outbox rows to RabbitMQ.
+
+    python relay.py [--batch-size 100] [--poll-ms 1000]
+    python relay.py --requeue-failed      # un-park failed rows and exit
+
+Run it next to consumer.py when the web app has OUTBOX_RELAY_IN_PROCESS=false
+(the default except on Postgres). On Postgres it can also run alongside the
+in-process relays (batches are claimed with SKIP LOCKED); on SQLite run only
+one relay in total.
+"""
+import signal
+import argparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.messaging import close_publisher
+from app.services.outbox import run_relay, requeue_failed, RELAY_BATCH_SIZE, RELAY_POLL_SECONDS
+
+_stopping = False
+
+def _request_stop(signum, frame):
+    global _stopping
+    print("Stopping relay...")
+    _stopping = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Activity outbox relay")
+    parser.add_argument("--batch-size", type=int, default=RELAY_BATCH_SIZE)
+    parser.add_argument("--poll-ms", type=int, default=int(RELAY_POLL_SECONDS * 1000))
+    parser.add_argument("--requeue-failed", action="store_true", help="un-park failed rows and exit")
+    args = parser.parse_args()
+
+    if args.requeue_failed:
+        print(f"Requeued {requeue_failed()} parked outbox events")
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    print(f"Outbox relay started (batch={args.batch_size}, poll={args.poll_ms}ms)")
+    try:
+        run_relay(lambda: _stopping, args.batch_size, args.poll_ms / 1000)
+    finally:
+        close_publisher()
@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+# the app reads DATABASE_URL at import time: point it at a throwaway SQLite file
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+import pytest
+
+from app.db.models import Base
+from app.db.session import engine, init_db
+
+init_db()
+
+
+@pytest.fixture
+def db():
+    """A session on the test database; every table is emptied afterwards."""
+    from app.db.session import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
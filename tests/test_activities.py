@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.models import Activity, OutboxEvent, UserDailyRollup
+from app.main import app
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(app) as client:
+        yield client
+
+
+def travel(user_id="u1", km=10):
+    return {"user_id": user_id, "type": "travel", "mode": "car", "distance_km": km}
+
+
+def test_batch_reports_errors_per_item_and_stores_the_rest(client, db):
+    items = [
+        travel(km=10),
+        {"user_id": "u1", "type": "travel", "mode": "car"},               # missing distance
+        {"user_id": "u1", "type": "travel", "mode": "rocket", "distance_km": 5},
+        {"user_id": "u1", "type": "electricity", "kwh": "lots"},          # schema error
+        {"user_id": "u1", "type": "electricity", "kwh": 2},
+    ]
+
+    response = client.post("/activities/batch", json={"items": items})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"]) == (2, 3)
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3, 4]
+    assert [r["ok"] for r in body["results"]] == [True, False, False, False, True]
+    for r in body["results"]:
+        assert (r["error"] is None) == r["ok"]
+    assert "distance_km" in body["results"][1]["error"]
+    assert "kwh" in body["results"][3]["error"]
+
+    stored = {a.id for a in db.query(Activity)}
+    assert stored == {body["results"][0]["activity_id"], body["results"][4]["activity_id"]}
+    assert db.query(OutboxEvent).count() == 2
+    total = sum(r.co2_kg for r in db.query(UserDailyRollup))
+    assert total == pytest.approx(body["results"][0]["co2_kg"] + body["results"][4]["co2_kg"])
+
+
+def test_batch_over_the_limit_is_rejected_whole(client, db, monkeypatch):
+    from app.api import activities
+
+    monkeypatch.setattr(activities, "MAX_BATCH_SIZE", 2)
+    response = client.post("/activities/batch", json={"items": [travel()] * 3})
+
+    assert response.status_code == 413
+    assert db.query(Activity).count() == 0
+
+
+def test_keyset_pages_cover_every_row_once(client, db):
+    # one batch: many rows share a created_at, so the id tiebreak matters
+    assert client.post("/activities/batch", json={"items": [travel(km=k) for k in range(1, 8)]}).json()["accepted"] == 7
+    client.post("/activities/batch", json={"items": [travel(user_id="u2")]})
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"user_id": "u1", "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/activities/", params=params)
+        assert response.status_code == 200
+        seen.extend((row["created_at"], row["id"]) for row in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert len(seen) == 7 and len(set(seen)) == 7
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_bad_cursor_is_a_400(client):
+    response = client.get("/activities/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
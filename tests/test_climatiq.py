@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+
+from app.services import climatiq
+
+
+class SlowClient:
+    """The first request hangs until cancelled; later ones answer `co2e`."""
+
+    def __init__(self, co2e):
+        self.co2e = co2e
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def post(self, url, json, headers):
+        self.calls += 1
+        if self.calls == 1:
+            self.started.set()
+            await asyncio.sleep(3600)
+        return httpx.Response(200, json={"co2e": self.co2e})
+
+
+def test_cancelled_owner_does_not_cache_a_failure(monkeypatch):
+    climatiq.clear_factor_cache()
+
+    async def main():
+        client = SlowClient(0.2)
+        monkeypatch.setattr(climatiq, "_get_async_client", lambda: client)
+
+        owner = asyncio.create_task(climatiq.get_factor_async("car", "distance"))
+        await client.started.wait()
+        waiter = asyncio.create_task(climatiq.get_factor_async("car", "distance"))
+        await asyncio.sleep(0)
+
+        owner.cancel()
+        # the waiter takes over the lookup instead of getting the fallback
+        assert await waiter == 0.2
+        assert client.calls == 2
+        assert owner.cancelled()
+
+        # and the real answer is what got cached
+        assert await climatiq.get_factor_async("car", "distance") == 0.2
+        assert client.calls == 2
+
+    asyncio.run(main())
+    climatiq.clear_factor_cache()
+
+
+def test_cancelled_waiter_leaves_the_lookup_alone(monkeypatch):
+    climatiq.clear_factor_cache()
+
+    async def main():
+        gate = asyncio.Event()
+
+        class Client:
+            async def post(self, url, json, headers):
+                await gate.wait()
+                return httpx.Response(200, json={"co2e": 0.5})
+
+        monkeypatch.setattr(climatiq, "_get_async_client", lambda: Client())
+        owner = asyncio.create_task(climatiq.get_factor_async("kwh", "energy"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(climatiq.get_factor_async("kwh", "energy"))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        assert await owner == 0.5
+
+    asyncio.run(main())
+    climatiq.clear_factor_cache()
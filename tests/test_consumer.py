@@ -0,0 +1,57 @@
+import json
+from datetime import datetime
+
+import consumer
+from app.db.models import Activity, Suggestion, UserDailyRollup, UserStats
+
+
+def add_activity(db, user_id="u1", co2_kg=3.5):
+    activity = Activity(user_id=user_id, type="travel", mode="car", distance_km=20,
+                        co2_kg=co2_kg, calculation_source="local_factors",
+                        created_at=datetime.utcnow())
+    db.add(activity)
+    db.flush()
+    db.add(Suggestion(activity_id=activity.id, user_id=user_id,
+                      suggestion_text="placeholder", source="fallback"))
+    # the web app writes the rollup in the activity's transaction
+    db.add(UserDailyRollup(user_id=user_id, day=activity.created_at.date(), type=activity.type,
+                           calculation_source=activity.calculation_source,
+                           co2_kg=co2_kg, activity_count=1))
+    db.commit()
+    return activity
+
+
+def body(activity):
+    return json.dumps({
+        "activity_id": activity.id,
+        "user_id": activity.user_id,
+        "type": activity.type,
+        "mode": activity.mode,
+        "distance_km": activity.distance_km,
+        "co2_kg": activity.co2_kg,
+        "created_at": activity.created_at.isoformat(),
+    }).encode()
+
+
+def suggestions(db, activity_id):
+    db.expire_all()
+    return db.query(Suggestion).filter(Suggestion.activity_id == activity_id).all()
+
+
+def test_redelivery_replaces_suggestions(db):
+    activity = add_activity(db)
+    message = body(activity)
+
+    assert consumer.handle_batch([message]) == [True]
+    first = suggestions(db, activity.id)
+    assert first and all(s.source in ("ai", "rule") for s in first)
+
+    # redelivered: once more in a batch, then retried on its own
+    assert consumer.handle_batch([message]) == [True]
+    assert consumer.handle_message(message) is True
+
+    again = suggestions(db, activity.id)
+    assert sorted(s.suggestion_text for s in again) == sorted(s.suggestion_text for s in first)
+
+    stats = db.query(UserStats).filter(UserStats.user_id == activity.user_id).one()
+    assert stats.daily_co2_kg == activity.co2_kg
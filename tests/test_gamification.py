@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+from app.db.models import UserDailyRollup
+from app.services.gamification import calculate_points, update_user_stats
+
+DAY = date(2024, 3, 1)
+
+
+def set_total(db, user_id, day, co2):
+    row = db.get(UserDailyRollup, (user_id, day, "travel", "local_factors"))
+    if row is None:
+        row = UserDailyRollup(user_id=user_id, day=day, type="travel",
+                              calculation_source="local_factors", co2_kg=0.0, activity_count=0)
+        db.add(row)
+    row.co2_kg = co2
+    row.activity_count += 1
+    db.commit()
+
+
+def test_upsert_is_idempotent(db):
+    set_total(db, "u1", DAY, 3.5)
+
+    first = update_user_stats(db, "u1", DAY)
+    # a redelivered message runs the same update again
+    again = update_user_stats(db, "u1", DAY)
+
+    assert first == again == {"daily_co2_kg": 3.5, "points": calculate_points(3.5), "streak": 1}
+
+
+def test_upsert_follows_the_rollup_and_the_streak_rule(db):
+    set_total(db, "u1", DAY, 5.0)
+    update_user_stats(db, "u1", DAY)
+
+    set_total(db, "u1", DAY + timedelta(days=1), 3.0)
+    assert update_user_stats(db, "u1", DAY + timedelta(days=1))["streak"] == 2
+
+    # a later activity pushes the day above yesterday: the streak restarts
+    set_total(db, "u1", DAY + timedelta(days=1), 6.0)
+    stats = update_user_stats(db, "u1", DAY + timedelta(days=1))
+    assert stats == {"daily_co2_kg": 6.0, "points": calculate_points(6.0), "streak": 1}
+
+    # a gap day: no row yesterday, so the streak starts over
+    set_total(db, "u1", DAY + timedelta(days=3), 1.0)
+    assert update_user_stats(db, "u1", DAY + timedelta(days=3))["streak"] == 1
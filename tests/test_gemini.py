@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services import gemini
+from app.services.gemini import InFlightLimit
+
+
+class Gauge:
+    def __init__(self):
+        self.now = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+
+    def leave(self):
+        with self._lock:
+            self.now -= 1
+
+
+class FakeClient:
+    """genai.Client stand-in whose sync and async calls both report to `gauge`."""
+
+    def __init__(self, gauge):
+        class Models:
+            def generate_content(self, model, contents, config):
+                gauge.enter()
+                time.sleep(0.02)
+                gauge.leave()
+                return SimpleNamespace(text="sync")
+
+        class AsyncModels:
+            async def generate_content(self, model, contents, config):
+                gauge.enter()
+                await asyncio.sleep(0.02)
+                gauge.leave()
+                return SimpleNamespace(text="async")
+
+        self.models = Models()
+        self.aio = SimpleNamespace(models=AsyncModels())
+
+
+def test_sync_and_async_calls_share_one_cap(monkeypatch):
+    gauge = Gauge()
+    monkeypatch.setattr(gemini, "get_client", lambda: FakeClient(gauge))
+    monkeypatch.setattr(gemini, "_in_flight", InFlightLimit(2))
+    monkeypatch.setattr(gemini, "limiter", gemini.RateLimiter(rpm=10000, tpm=10**9))
+    monkeypatch.setattr(gemini, "GEMINI_SLOT_DEADLINE", 5)
+    results = []
+
+    async def coroutines():
+        results.extend(await asyncio.gather(*(gemini.generate_async("p") for _ in range(6))))
+
+    threads = [threading.Thread(target=lambda: results.append(gemini.generate("p"))) for _ in range(6)]
+    threads.append(threading.Thread(target=lambda: asyncio.run(coroutines())))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert gauge.peak == 2
+    assert sorted(results) == ["async"] * 6 + ["sync"] * 6
+
+
+def test_async_waiter_times_out_then_gets_a_released_slot():
+    limit = InFlightLimit(1)
+    assert limit.acquire(timeout=0)
+
+    async def main():
+        assert await limit.acquire_async(0.01) is False
+
+        waiter = asyncio.create_task(limit.acquire_async(5))
+        await asyncio.sleep(0.01)
+        threading.Thread(target=limit.release).start()
+        assert await waiter is True
+
+        # the timed-out waiter didn't keep a slot: exactly one is in use
+        assert limit.acquire(timeout=0) is False
+        limit.release()
+        assert limit.acquire(timeout=0) is True
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    limit = InFlightLimit(1)
+    assert limit.acquire(timeout=0)
+
+    async def main():
+        cancelled = asyncio.create_task(limit.acquire_async(5))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        limit.release()
+        await asyncio.sleep(0)
+        assert await limit.acquire_async(0.1) is True
+
+    asyncio.run(main())
@@ -0,0 +1,244 @@
+import inspect
+import json
+
+import pika
+from pika.exceptions import AMQPConnectionError
+
+from app.services import messaging
+from app.services.messaging import ActivityPublisher, _ChannelSlot
+
+
+# --------------------------------------------------
+# Fakes
+# --------------------------------------------------
+
+class FakeChannel:
+    def __init__(self):
+        self.declared = []
+
+    def queue_declare(self, queue, durable):
+        self.declared.append(queue)
+
+
+class FakeSlot:
+    """Confirms `confirm` messages of each batch, then optionally raises."""
+
+    def __init__(self, params, confirm=None, error=None):
+        self.params = params
+        self.channel = FakeChannel()
+        self.batches = []
+        self.confirm = confirm
+        self.error = error
+        self.confirmed = 0
+        self.rejected = False
+        self.closed = False
+        self.usable = True
+
+    def is_usable(self):
+        return self.usable
+
+    def close(self):
+        self.closed = True
+
+    def publish(self, routing_key, bodies):
+        self.batches.append([json.loads(b) for b in bodies])
+        self.confirmed = len(bodies) if self.confirm is None else min(self.confirm, len(bodies))
+        # short without an exception: the broker nacked the next message
+        self.rejected = self.confirmed < len(bodies) and self.error is None
+        if self.error is not None:
+            raise self.error
+        return self.confirmed
+
+
+def publisher(slots, **kwargs):
+    """ActivityPublisher handing out `slots` in order from its slot_factory."""
+    created = []
+
+    def slot_factory(params):
+        slot = slots[len(created)]
+        created.append(slot)
+        return slot
+
+    kwargs.setdefault("retries", 1)
+    pub = ActivityPublisher(queue_name="q", params_factory=lambda: "params",
+                            slot_factory=slot_factory, **kwargs)
+    return pub, created
+
+
+# --------------------------------------------------
+# Pool
+# --------------------------------------------------
+
+def test_checkout_reuses_idle_slot_and_declares_once():
+    slot = FakeSlot("params")
+    pub, created = publisher([slot], pool_size=1)
+
+    assert pub.publish_many([{"n": 1}]).sent == 1
+    assert pub.publish_many([{"n": 2}, {"n": 3}]).sent == 2
+
+    assert created == [slot]
+    assert slot.channel.declared == ["q"]
+    assert slot.batches == [[{"n": 1}], [{"n": 2}, {"n": 3}]]
+
+
+def test_checkout_replaces_unusable_slot():
+    stale, fresh = FakeSlot("params"), FakeSlot("params")
+    pub, created = publisher([stale, fresh], pool_size=1)
+
+    pub.publish_many([{"n": 1}])
+    stale.usable = False
+    assert pub.publish_many([{"n": 2}]).sent == 1
+
+    assert stale.closed
+    assert fresh.batches == [[{"n": 2}]]
+
+
+def test_checkout_timeout_publishes_nothing():
+    pub, _ = publisher([FakeSlot("params")], pool_size=1, checkout_timeout=0.01)
+    held = pub._checkout()
+
+    assert pub.publish_many([{"n": 1}]) == (0, False)
+    assert held.batches == []
+
+
+# --------------------------------------------------
+# Reconnect and partial counts
+# --------------------------------------------------
+
+def test_reconnect_after_amqp_error_resumes_after_confirmed():
+    broken = FakeSlot("params", confirm=2, error=AMQPConnectionError("reset"))
+    fresh = FakeSlot("params")
+    pub, created = publisher([broken, fresh])
+    payloads = [{"n": i} for i in range(5)]
+
+    assert pub.publish_many(payloads) == (5, False)
+
+    assert created == [broken, fresh]
+    assert broken.closed
+    assert fresh.batches == [payloads[2:]]
+
+
+def test_partial_publish_count_when_retries_run_out():
+    first = FakeSlot("params", confirm=3)
+    second = FakeSlot("params", confirm=0)
+    pub, _ = publisher([first, second], retries=1)
+
+    # the broker refused message 3 on both channels: not an outage
+    assert pub.publish_many([{"n": i} for i in range(5)]) == (3, True)
+    assert first.closed and second.closed
+    assert len(second.batches[0]) == 2
+
+
+def test_connection_errors_are_not_rejections():
+    reset = AMQPConnectionError("reset")
+    first = FakeSlot("params", confirm=1, error=reset)
+    second = FakeSlot("params", confirm=0, error=reset)
+    pub, _ = publisher([first, second], retries=1)
+
+    assert pub.publish_many([{"n": 1}, {"n": 2}]) == (1, False)
+
+
+def test_unexpected_error_returns_confirmed_count():
+    slot = FakeSlot("params", confirm=1, error=ValueError("boom"))
+    pub, _ = publisher([slot])
+
+    assert pub.publish_many([{"n": 1}, {"n": 2}]).sent == 1
+    assert slot.closed
+
+
+# --------------------------------------------------
+# Delivery-tag watermark
+# --------------------------------------------------
+
+class FakeConnection:
+    """Answers Confirm.Select, then replays scripted Basic.Ack/Nack frames."""
+
+    def __init__(self, params, script):
+        self.script = list(script)
+        self.is_open = True
+        self.published = []
+        self.waits = 0
+        self._selected = None
+        self._on_confirm = None
+
+    # BlockingConnection
+    def channel(self):
+        return self
+
+    def process_data_events(self, time_limit=None):
+        if self._selected is not None:
+            callback, self._selected = self._selected, None
+            callback(pika.frame.Method(1, pika.spec.Confirm.SelectOk()))
+            return
+        self.waits += 1
+        while self.script:
+            self._on_confirm(pika.frame.Method(1, self.script.pop(0)))
+
+    # BlockingChannel / Channel
+    @property
+    def _impl(self):
+        return self
+
+    def confirm_delivery(self, ack_nack_callback, callback):
+        self._on_confirm = ack_nack_callback
+        self._selected = callback
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append(body)
+
+
+def test_installed_pika_still_has_the_private_channel_api():
+    # _ChannelSlot enables confirms on BlockingChannel._impl (see requirements.txt)
+    from pika.adapters.blocking_connection import BlockingChannel
+
+    assert "self._impl = channel_impl" in inspect.getsource(BlockingChannel.__init__)
+    params = inspect.signature(pika.channel.Channel.confirm_delivery).parameters
+    assert {"ack_nack_callback", "callback"} <= set(params)
+
+
+def slot_with(monkeypatch, script):
+    monkeypatch.setattr(messaging.pika, "BlockingConnection", lambda params: FakeConnection(params, script))
+    return _ChannelSlot("params")
+
+
+def test_batch_waits_for_confirms_once(monkeypatch):
+    slot = slot_with(monkeypatch, [pika.spec.Basic.Ack(delivery_tag=3, multiple=True)])
+
+    assert slot.publish("q", [b"1", b"2", b"3"]) == 3
+    assert slot.connection.published == [b"1", b"2", b"3"]
+    assert slot.connection.waits == 1
+
+
+def test_nack_stops_the_leading_count(monkeypatch):
+    slot = slot_with(monkeypatch, [
+        pika.spec.Basic.Ack(delivery_tag=1),
+        pika.spec.Basic.Nack(delivery_tag=2),
+        pika.spec.Basic.Ack(delivery_tag=4, multiple=True),
+    ])
+
+    assert slot.publish("q", [b"1", b"2", b"3", b"4"]) == 1
+    assert slot.rejected
+
+
+def test_missing_confirm_times_out(monkeypatch):
+    slot = slot_with(monkeypatch, [pika.spec.Basic.Ack(delivery_tag=1)])
+
+    assert slot.publish("q", [b"1", b"2"], timeout=0.01) == 1
+    assert slot.rejected
+
+
+def test_closed_channel_is_not_a_rejection(monkeypatch):
+    slot = slot_with(monkeypatch, [])
+    slot.connection.is_open = False
+
+    assert slot.publish("q", [b"1"]) == 0
+    assert not slot.rejected
+
+
+def test_delivery_tags_continue_across_batches(monkeypatch):
+    slot = slot_with(monkeypatch, [])
+    slot.connection.script = [pika.spec.Basic.Ack(delivery_tag=2, multiple=True)]
+    assert slot.publish("q", [b"1", b"2"]) == 2
+
+    slot.connection.script = [pika.spec.Basic.Ack(delivery_tag=3)]
+    assert slot.publish("q", [b"3"]) == 1
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.metrics import MetricsMiddleware, render
+
+
+def route_labels(text: str, method: str):
+    prefix = f'http_requests_total{{method="{method}",route="'
+    return {line[len(prefix):].split('"', 1)[0] for line in text.splitlines() if line.startswith(prefix)}
+
+
+def test_routers_sharing_a_sub_path_get_distinct_labels():
+    first, second = APIRouter(), APIRouter()
+
+    @first.get("/users/{user_id}")
+    def first_user(user_id: str):
+        return {}
+
+    @second.get("/users/{user_id}")
+    def second_user(user_id: str):
+        return {}
+
+    @second.post("/")
+    def second_root():
+        return {}
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(first, prefix="/first")
+    app.include_router(second, prefix="/second")
+
+    client = TestClient(app)
+    assert client.get("/first/users/1").status_code == 200
+    assert client.get("/second/users/2").status_code == 200
+    assert client.post("/second/").status_code == 200
+    assert client.get("/nowhere").status_code == 404
+
+    labels = route_labels(render(), "GET")
+    assert {"/first/users/{user_id}", "/second/users/{user_id}", "unmatched"} <= labels
+    assert "/users/{user_id}" not in labels
+    # the registry is process-wide: other tests' routes may be there too
+    post = route_labels(render(), "POST")
+    assert "/second/" in post and "/" not in post
@@ -0,0 +1,59 @@
+from app.db.models import OutboxEvent
+from app.services import outbox
+from app.services.messaging import PublishResult
+
+
+def add_events(db, n):
+    for i in range(n):
+        db.add(OutboxEvent(payload={"activity_id": i + 1}))
+    db.commit()
+
+
+def events(db):
+    db.expire_all()
+    return {e.id: e for e in db.query(OutboxEvent).order_by(OutboxEvent.id)}
+
+
+def publisher(monkeypatch, result):
+    calls = []
+
+    def publish_activities(payloads):
+        calls.append(payloads)
+        return result(payloads) if callable(result) else result
+
+    monkeypatch.setattr(outbox, "publish_activities", publish_activities)
+    return calls
+
+
+def test_outage_does_not_charge_or_park_rows(db, monkeypatch):
+    add_events(db, 3)
+    publisher(monkeypatch, PublishResult(0, False))
+
+    for _ in range(outbox.MAX_ATTEMPTS * 2):
+        assert outbox.relay_batch(10) == (3, 0)
+
+    assert all(e.attempts == 0 and e.failed_at is None for e in events(db).values())
+
+
+def test_rejected_row_is_parked_after_max_attempts(db, monkeypatch):
+    add_events(db, 3)
+    # row 2 is refused every time; row 1 goes through
+    publisher(monkeypatch, lambda payloads: PublishResult(1 if payloads[0]["activity_id"] == 1 else 0, True))
+
+    outbox.relay_batch(10)
+    for _ in range(outbox.MAX_ATTEMPTS - 1):
+        assert outbox.relay_batch(10) == (2, 0)
+
+    rows = events(db)
+    assert rows[1].sent_at is not None
+    assert rows[2].attempts == outbox.MAX_ATTEMPTS and rows[2].failed_at is not None
+    assert rows[3].attempts == 0 and rows[3].failed_at is None
+
+    # parked rows are skipped
+    calls = publisher(monkeypatch, lambda payloads: PublishResult(len(payloads), False))
+    assert outbox.relay_batch(10) == (1, 1)
+    assert calls == [[{"activity_id": 3}]]
+
+    assert outbox.requeue_failed() == 1
+    assert outbox.relay_batch(10) == (1, 1)
+    assert all(e.sent_at is not None for e in events(db).values())
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.services import response_cache
+from app.services.response_cache import MemoryBackend, bump_user, cached
+
+
+class SharedBackend(MemoryBackend):
+    """In-process stand-in for the Redis backend."""
+    shared = True
+
+
+@pytest.fixture
+def backend():
+    def use(cls):
+        backend = cls()
+        response_cache.set_backend(backend)
+        return backend
+
+    yield use
+    response_cache.set_backend(None)
+
+
+def counting_loader():
+    calls = []
+
+    async def load(db):
+        calls.append(1)
+        return {"n": len(calls)}
+
+    return load, calls
+
+
+def test_memory_backend_caches_web_only_endpoints(backend):
+    backend(MemoryBackend)
+    load, calls = counting_loader()
+
+    async def main():
+        assert await cached("e", "u1", None, load) == {"n": 1}
+        assert await cached("e", "u1", None, load) == {"n": 1}
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_memory_backend_skips_consumer_written_endpoints(backend):
+    backend(MemoryBackend)
+    load, calls = counting_loader()
+
+    async def main():
+        assert await cached("e", "u1", None, load, consumer_written=True) == {"n": 1}
+        # a consumer write in another process can't bump this backend
+        assert await cached("e", "u1", None, load, consumer_written=True) == {"n": 2}
+
+    asyncio.run(main())
+
+
+def test_shared_backend_caches_until_the_consumer_bumps(backend):
+    backend(SharedBackend)
+    load, calls = counting_loader()
+
+    async def main():
+        return [await cached("e", "u1", None, load, consumer_written=True) for _ in range(2)]
+
+    assert asyncio.run(main()) == [{"n": 1}, {"n": 1}]
+    bump_user("u1")
+    assert asyncio.run(main()) == [{"n": 2}, {"n": 2}]
@@ -0,0 +1,48 @@
+from datetime import date, datetime, timedelta
+
+from app.db.models import UserDailyRollup, UserStats
+from app.services.stats_recompute import recompute_stats
+
+D1 = date(2024, 3, 1)
+
+
+def day(n):
+    return D1 + timedelta(days=n)
+
+
+def add_rollup(db, user_id, totals):
+    for d, co2 in totals.items():
+        db.add(UserDailyRollup(user_id=user_id, day=d, type="travel",
+                               calculation_source="local_factors", co2_kg=co2, activity_count=1))
+    db.commit()
+
+
+def stats(db, user_id):
+    db.expire_all()
+    rows = db.query(UserStats).filter(UserStats.user_id == user_id).order_by(UserStats.date)
+    return [(r.date.date(), r.daily_co2_kg, r.points, r.streak) for r in rows]
+
+
+def test_idle_day_gets_a_break_row(db):
+    # active day 0 and 1, idle 2 and 3, active 4, idle 5
+    add_rollup(db, "u1", {day(0): 2.0, day(1): 1.0, day(4): 1.0})
+    # no history before day 3: no break rows for it
+    add_rollup(db, "u2", {day(3): 1.0})
+
+    recompute_stats(day(0), day(5), shards=2, workers=1)
+
+    u1 = stats(db, "u1")
+    assert [(d, streak) for d, _, _, streak in u1] == [
+        (day(0), 1), (day(1), 2), (day(2), 0), (day(4), 1), (day(5), 0),
+    ]
+    assert u1[2][1:] == (0.0, 0, 0)
+    assert [(d, streak) for d, _, _, streak in stats(db, "u2")] == [(day(3), 1), (day(4), 0)]
+
+
+def test_rerun_for_one_day_replaces_its_rows(db):
+    add_rollup(db, "u1", {day(0): 2.0, day(1): 1.0})
+
+    recompute_stats(day(0), day(2), shards=2, workers=1)
+    recompute_stats(day(2), day(2), shards=2, workers=1)
+
+    assert [(d, streak) for d, _, _, streak in stats(db, "u1")] == [(day(0), 1), (day(1), 2), (day(2), 0)]